@@ -1,7 +1,7 @@
-from app import create_app
+from app import get_app
 
-# create app instance
-app = create_app()
+# shared app instance, same one gunicorn gets from app:app
+app = get_app()
 
 if __name__ == '__main__':
     # run in dev mode
@@ -1,40 +1,84 @@
+import threading
 from flask import Flask
 from flask_login import LoginManager
 from app.config import Config
-from app.models import db, User
+from app.models import db
 
 # init Flask-Login
 login_manager = LoginManager()
 
 def create_app(config_class=Config):
-    """Create and configure the Flask app"""
+    """
+    Create and configure the Flask app
+
+    Does no database or storage I/O. Tables and containers are created
+    once with `flask --app app init-db`.
+    """
 
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # replica URLs become binds, so this comes before init_app
+    from app.replicas import configure_replicas, init_replicas
+    configure_replicas(app.config)
     db.init_app(app)
+    init_replicas(app)
 
     login_manager.init_app(app)
     login_manager.login_view = 'login'
     login_manager.login_message = 'Please log in first'
 
-    with app.app_context():
-        db.create_all()
+    # storage service is shared by all requests in this worker
+    from app.blob_service import init_blob_service
+    init_blob_service(app)
+
+    from app.identity import init_user_cache
+    init_user_cache(app)
+
+    from app.page_cache import init_page_cache
+    init_page_cache(app)
+
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    from app.thumbnail_queue import init_thumbnail_queue
+    init_thumbnail_queue(app)
 
     from app.routes import register_routes
     register_routes(app)
 
+    from app.cli import register_commands
+    register_commands(app)
+
     return app
 
 
-# module-level app instance for Azure deployment
-app = create_app()
+_app = None
+_app_lock = threading.Lock()
+
+
+def get_app():
+    """Process-wide app instance, created on first call"""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
+
+
+def __getattr__(name):
+    # `app` for Azure deployment (gunicorn app:app), built on first access
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID for Flask-Login"""
+    """Load user by ID for Flask-Login, cached per worker"""
+    from app.identity import load_cached_user
     try:
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
     except Exception as e:
         print(f"Error loading user {user_id}: {str(e)}")
         return None
@@ -1,15 +1,34 @@
-"""Azure Blob Storage service for image uploads"""
+"""Azure Blob Storage service for image uploads
 
+The Azure SDK is imported inside the methods that need it, so importing
+this module (and booting a worker) does not pay for it.
+"""
+
+import hashlib
 import os
 import uuid
+import threading
 from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
+from flask import current_app
+from app.sas_signer import SasUrlSigner
+from app.metrics import timed
+from app.storage import BlobNotFoundError, StorageService
+
 
+# max subrequests in one Blob Batch request
+BATCH_DELETE_SIZE = 256
 
-class BlobStorageService:
+
+class BlobStorageService(StorageService):
     """Azure Blob Storage service"""
 
-    def __init__(self, connection_string, container_original, container_thumbnail):
+    supports_direct_upload = True
+
+    def __init__(self, connection_string, container_original, container_thumbnail,
+                 pool_maxsize=20, ensure_containers=True,
+                 sas_bucket_seconds=3600, sas_validity_seconds=86400, sas_cache_size=10000,
+                 upload_block_size=4 * 1024 * 1024, max_single_put_size=4 * 1024 * 1024,
+                 upload_max_concurrency=4):
         """
         Init blob storage service
 
@@ -17,13 +36,53 @@ class BlobStorageService:
             connection_string: Azure Storage connection string
             container_original: Original images container
             container_thumbnail: Thumbnails container
+            pool_maxsize: Max keep-alive connections kept to the storage account
+            ensure_containers: Create missing containers on init
+            sas_bucket_seconds: Window during which a blob keeps the same read URL
+            sas_validity_seconds: Minimum lifetime left on a read URL when it is replaced
+            sas_cache_size: Max cached read URLs
+            upload_block_size: Size of each staged block for chunked uploads
+            max_single_put_size: Uploads up to this size go in one request
+            upload_max_concurrency: Blocks uploaded in parallel per file
         """
-        self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+        import requests
+        from requests.adapters import HTTPAdapter
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.storage.blob import BlobServiceClient
+
+        # one pooled HTTP session shared by every call on this service
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            transport=RequestsTransport(session=session, session_owner=False),
+            max_block_size=upload_block_size,
+            max_single_put_size=max_single_put_size
+        )
+        self.upload_max_concurrency = upload_max_concurrency
         self.container_original = container_original
         self.container_thumbnail = container_thumbnail
 
+        self.signer = SasUrlSigner(
+            account_url=self.blob_service_client.url,
+            account_name=self.blob_service_client.account_name,
+            account_key=self.blob_service_client.credential.account_key,
+            bucket_seconds=sas_bucket_seconds,
+            validity_seconds=sas_validity_seconds,
+            maxsize=sas_cache_size
+        )
+
+        if ensure_containers:
+            self._ensure_containers_exist()
+
+    def ensure_containers(self):
+        """Create the original and thumbnail containers if missing"""
         self._ensure_containers_exist()
 
+    @timed('ensure_containers_exist')
     def _ensure_containers_exist(self):
         """Make sure containers exist"""
         try:
@@ -55,24 +114,37 @@ class BlobStorageService:
         unique_id = str(uuid.uuid4())
         return f"{unique_id}{ext}"
 
-    def upload_file(self, file_stream, original_filename, content_type='image/jpeg'):
+    @timed('upload_file')
+    def upload_file(self, file_stream, original_filename, content_type='image/jpeg', length=None):
         """
         Upload file to Azure Blob
 
+        Files larger than the single-put size are streamed as staged
+        blocks, several at a time, and committed with one block list.
+
         Args:
             file_stream: File stream
             original_filename: Original filename
             content_type: File MIME type
+            length: Stream size in bytes, if known
 
         Returns:
             dict: Contains blob_name and url
         """
+        from azure.storage.blob import ContentSettings
+
         try:
             blob_name = self._generate_unique_filename(original_filename)
             container_client = self.blob_service_client.get_container_client(self.container_original)
 
             blob_client = container_client.get_blob_client(blob_name)
-            blob_client.upload_blob(file_stream, content_type=content_type, overwrite=True)
+            blob_client.upload_blob(
+                file_stream,
+                length=length,
+                overwrite=True,
+                max_concurrency=self.upload_max_concurrency,
+                content_settings=ContentSettings(content_type=content_type)
+            )
 
             blob_url = blob_client.url
 
@@ -89,14 +161,76 @@ class BlobStorageService:
                 'error': str(e)
             }
 
-    def generate_download_url(self, blob_name, container_name=None, expiry_hours=24):
+    @timed('generate_upload_url')
+    def generate_upload_url(self, original_filename, expiry_minutes=15):
+        """
+        Generate a short-lived write URL so the browser uploads directly
+
+        Args:
+            original_filename: Original filename
+            expiry_minutes: URL validity in minutes
+
+        Returns:
+            dict: Contains blob_name and upload_url
+        """
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        blob_name = self._generate_unique_filename(original_filename)
+        account_name = self.blob_service_client.account_name
+
+        sas_token = generate_blob_sas(
+            account_name=account_name,
+            container_name=self.container_original,
+            blob_name=blob_name,
+            account_key=self.blob_service_client.credential.account_key,
+            # create only: once the blob exists it cannot be replaced through this URL
+            permission=BlobSasPermissions(create=True),
+            expiry=datetime.utcnow() + timedelta(minutes=expiry_minutes)
+        )
+
+        return {
+            'blob_name': blob_name,
+            'upload_url': f"{self.signer.account_url}/{self.container_original}/{blob_name}?{sas_token}"
+        }
+
+    @timed('get_blob_properties')
+    def get_blob_properties(self, blob_name, container_name=None):
+        """
+        Get size and content type of a blob
+
+        Args:
+            blob_name: Blob filename
+            container_name: Container name (default: originals)
+
+        Returns:
+            dict: Contains size and content_type, or None if missing
+        """
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            blob_client = self.blob_service_client.get_blob_client(
+                container=container_name or self.container_original,
+                blob=blob_name
+            )
+            properties = blob_client.get_blob_properties()
+            return {
+                'size': properties.size,
+                'content_type': properties.content_settings.content_type
+            }
+
+        except ResourceNotFoundError:
+            return None
+
+    @timed('generate_download_url')
+    def generate_download_url(self, blob_name, container_name=None, expiry_hours=None):
         """
         Generate download URL with SAS token
 
         Args:
             blob_name: Blob filename
             container_name: Container name (default: originals)
-            expiry_hours: URL validity in hours
+            expiry_hours: URL validity in hours, None for a cached,
+                          time-bucketed URL that stays the same across requests
 
         Returns:
             Full URL with SAS token
@@ -105,6 +239,11 @@ class BlobStorageService:
             if container_name is None:
                 container_name = self.container_original
 
+            if expiry_hours is None:
+                return self.signer.sign(container_name, blob_name)
+
+            from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
             account_name = self.blob_service_client.account_name
             account_key = self.blob_service_client.credential.account_key
 
@@ -128,6 +267,79 @@ class BlobStorageService:
             )
             return blob_client.url
 
+    @timed('sign_many')
+    def sign_many(self, blob_names, container_name=None):
+        """
+        Generate cached download URLs for many blobs at once
+
+        Args:
+            blob_names: Iterable of blob filenames
+            container_name: Container name (default: originals)
+
+        Returns:
+            dict: blob_name -> URL
+        """
+        if container_name is None:
+            container_name = self.container_original
+
+        try:
+            return self.signer.sign_many(container_name, blob_names)
+        except Exception as e:
+            print(f"Error generating URLs: {e}")
+            return {name: self.generate_download_url(name, container_name) for name in blob_names}
+
+    @timed('download_file')
+    def download_file(self, blob_name, container_name=None):
+        """
+        Download a whole blob
+
+        Args:
+            blob_name: Blob filename
+            container_name: Container name (default: originals)
+
+        Returns:
+            bytes: Blob content
+
+        Raises:
+            BlobNotFoundError: If the blob does not exist
+        """
+        from azure.core.exceptions import ResourceNotFoundError
+
+        blob_client = self.blob_service_client.get_blob_client(
+            container=container_name or self.container_original,
+            blob=blob_name
+        )
+        try:
+            return blob_client.download_blob(max_concurrency=self.upload_max_concurrency).readall()
+        except ResourceNotFoundError as e:
+            raise BlobNotFoundError(blob_name) from e
+
+    @timed('upload_bytes')
+    def upload_bytes(self, data, blob_name, container_name=None, content_type='application/octet-stream',
+                     cache_control=None):
+        """
+        Upload bytes under a fixed blob name, e.g. a thumbnail rendition
+
+        Args:
+            data: Blob content
+            blob_name: Blob filename
+            container_name: Container name (default: thumbnails)
+            content_type: File MIME type
+            cache_control: Cache-Control stored on the blob
+        """
+        from azure.storage.blob import ContentSettings
+
+        blob_client = self.blob_service_client.get_blob_client(
+            container=container_name or self.container_thumbnail,
+            blob=blob_name
+        )
+        blob_client.upload_blob(
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=content_type, cache_control=cache_control)
+        )
+
+    @timed('delete_file')
     def delete_file(self, blob_name, container_name=None):
         """
         Delete file
@@ -153,6 +365,70 @@ class BlobStorageService:
             print(f"Delete error: {e}")
             return False
 
+    def list_blobs(self, container_name=None, page_size=5000):
+        """
+        Walk a container page by page, in name order
+
+        Args:
+            container_name: Container name (default: originals)
+            page_size: Max blobs per listing request
+
+        Yields:
+            list: (blob_name, last_modified) tuples
+        """
+        container_client = self.blob_service_client.get_container_client(container_name or self.container_original)
+        for page in container_client.list_blobs(results_per_page=page_size).by_page():
+            yield [(blob.name, blob.last_modified) for blob in page]
+
+    @timed('delete_many')
+    def delete_many(self, blob_names, container_name=None):
+        """
+        Delete many blobs with the Blob Batch API
+
+        Each request carries up to BATCH_DELETE_SIZE deletes. Blobs that
+        are already gone count as not deleted, other failures are printed.
+
+        Args:
+            blob_names: Blob names
+            container_name: Container name (default: originals)
+
+        Returns:
+            int: Blobs deleted
+        """
+        container_client = self.blob_service_client.get_container_client(container_name or self.container_original)
+        blob_names = list(blob_names)
+        deleted = 0
+
+        for start in range(0, len(blob_names), BATCH_DELETE_SIZE):
+            chunk = blob_names[start:start + BATCH_DELETE_SIZE]
+            try:
+                responses = container_client.delete_blobs(*chunk, raise_on_any_failure=False)
+                for blob_name, response in zip(chunk, responses):
+                    if response.status_code in (200, 202):
+                        deleted += 1
+                    elif response.status_code != 404:
+                        print(f"Delete error: {blob_name}: HTTP {response.status_code}")
+            except Exception as e:
+                print(f"Batch delete error: {e}")
+
+        return deleted
+
+    def thumbnail_url_for(self, original_blob_name):
+        """
+        Build thumbnail URL without checking the blob exists
+
+        Callers should only use this once the image row says the
+        thumbnail is ready.
+
+        Args:
+            original_blob_name: Original blob name
+
+        Returns:
+            Thumbnail URL with SAS token
+        """
+        return self.generate_download_url(original_blob_name, self.container_thumbnail)
+
+    @timed('get_thumbnail_url')
     def get_thumbnail_url(self, original_blob_name):
         """
         Get thumbnail URL if exists
@@ -177,6 +453,124 @@ class BlobStorageService:
             return None
 
 
+_service_lock = threading.Lock()
+
+
+def init_blob_service(app, service=None):
+    """
+    Attach a storage service to the app
+
+    Args:
+        app: Flask app
+        service: Ready-made service (e.g. InMemoryStorageService for
+                 tests), or None to build one from config
+                 on first use
+    """
+    app.extensions['blob_service'] = service
+
+
+def get_blob_service():
+    """
+    Get the shared storage service for the current app
+
+    The service is built once per worker process and reused, so the
+    connection string is parsed and the HTTP pool opened only on first
+    use. Containers are created by `flask init-db`, not here.
+
+    Returns:
+        Storage service instance
+    """
+    app = current_app._get_current_object()
+    service = app.extensions.get('blob_service')
+    if service is not None:
+        return service
+
+    with _service_lock:
+        service = app.extensions.get('blob_service')
+        if service is None:
+            service = build_storage_service(app.config)
+            app.extensions['blob_service'] = service
+    return service
+
+
+# config keys build_storage_service reads, e.g. to rebuild it in worker processes
+STORAGE_CONFIG_KEYS = (
+    'STORAGE_BACKEND', 'LOCAL_STORAGE_PATH', 'MEDIA_URL',
+    'AZURE_STORAGE_CONNECTION_STRING', 'AZURE_STORAGE_CONTAINER_ORIGINAL',
+    'AZURE_STORAGE_CONTAINER_THUMBNAIL', 'AZURE_STORAGE_POOL_MAXSIZE',
+    'SAS_BUCKET_MINUTES', 'SAS_VALIDITY_HOURS', 'SAS_CACHE_SIZE',
+    'BLOB_UPLOAD_BLOCK_SIZE', 'BLOB_MAX_SINGLE_PUT_SIZE', 'BLOB_UPLOAD_MAX_CONCURRENCY',
+)
+
+
+def build_storage_service(config):
+    """
+    Build a storage service from app config
+
+    Args:
+        config: Mapping with the STORAGE_CONFIG_KEYS settings
+
+    Returns:
+        BlobStorageService or LocalStorageService, per STORAGE_BACKEND
+
+    Raises:
+        ValueError: For an unknown STORAGE_BACKEND
+    """
+    backend = config['STORAGE_BACKEND']
+    if backend == 'local':
+        from app.local_storage import LocalStorageService
+        return LocalStorageService(
+            root=config['LOCAL_STORAGE_PATH'],
+            container_original=config['AZURE_STORAGE_CONTAINER_ORIGINAL'],
+            container_thumbnail=config['AZURE_STORAGE_CONTAINER_THUMBNAIL'],
+            url_prefix=config['MEDIA_URL']
+        )
+    if backend != 'azure':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+    return BlobStorageService(
+        connection_string=config['AZURE_STORAGE_CONNECTION_STRING'],
+        container_original=config['AZURE_STORAGE_CONTAINER_ORIGINAL'],
+        container_thumbnail=config['AZURE_STORAGE_CONTAINER_THUMBNAIL'],
+        pool_maxsize=config['AZURE_STORAGE_POOL_MAXSIZE'],
+        ensure_containers=False,
+        sas_bucket_seconds=config['SAS_BUCKET_MINUTES'] * 60,
+        sas_validity_seconds=config['SAS_VALIDITY_HOURS'] * 3600,
+        sas_cache_size=config['SAS_CACHE_SIZE'],
+        upload_block_size=config['BLOB_UPLOAD_BLOCK_SIZE'],
+        max_single_put_size=config['BLOB_MAX_SINGLE_PUT_SIZE'],
+        upload_max_concurrency=config['BLOB_UPLOAD_MAX_CONCURRENCY']
+    )
+
+
+def content_hash(stream, chunk_size=1024 * 1024):
+    """
+    sha256 of a seekable stream, read in chunks
+
+    The stream is rewound afterwards so it can still be uploaded.
+
+    Args:
+        stream: Seekable binary stream
+        chunk_size: Bytes read per step
+
+    Returns:
+        str: Hex digest, or None if the stream cannot seek
+    """
+    digest = hashlib.sha256()
+    try:
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+        stream.seek(0)
+    except (AttributeError, OSError):
+        return None
+    return digest.hexdigest()
+
+
+# content types a direct upload may be stored with, matching allowed_file
+ALLOWED_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+
+
 def allowed_file(filename, allowed_extensions={'png', 'jpg', 'jpeg', 'gif', 'webp'}):
     """
     Check if file extension is allowed
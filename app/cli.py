@@ -0,0 +1,126 @@
+"""Flask CLI commands for setup and maintenance"""
+
+import os
+import signal
+import click
+from flask import current_app
+from app.models import db
+
+
+def register_commands(app):
+    """Register CLI commands on the app"""
+
+    @app.cli.command('init-db')
+    @click.option('--skip-storage', is_flag=True, help='Only create database tables')
+    def init_db(skip_storage):
+        """Create database tables and storage containers"""
+        db.create_all()
+        # tables that already existed get no after_create event
+        from app.search import ensure_search_index
+        with db.engine.begin() as connection:
+            ensure_search_index(connection)
+        click.echo('Database tables created')
+
+        if skip_storage:
+            return
+
+        from app.blob_service import get_blob_service
+        get_blob_service().ensure_containers()
+        click.echo('Storage containers ready')
+
+    @app.cli.group('thumbnails')
+    def thumbnails():
+        """Thumbnail maintenance"""
+
+    @thumbnails.command('backfill')
+    @click.option('--workers', default=os.cpu_count() or 2, show_default=True,
+                  help='Render processes, 0 to render in this process')
+    @click.option('--in-flight', default=None, type=int,
+                  help='Max blobs downloading/rendering at once (default 2 x workers)')
+    @click.option('--batch-size', default=500, show_default=True, help='Rows fetched per query')
+    @click.option('--checkpoint', 'checkpoint_path', default=None,
+                  help='Checkpoint file (default instance/thumbnail_backfill.json)')
+    @click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first image')
+    @click.option('--retry-failed', is_flag=True, help='Also retry images marked failed')
+    @click.option('--limit', default=None, type=int, help='Stop after this many images')
+    def backfill_thumbnails(workers, in_flight, batch_size, checkpoint_path, restart, retry_failed, limit):
+        """Regenerate missing or stale thumbnails, resuming from the checkpoint"""
+        from app.blob_service import get_blob_service
+        from app.thumbnails import backfill, configured_sizes
+
+        if checkpoint_path is None:
+            os.makedirs(current_app.instance_path, exist_ok=True)
+            checkpoint_path = os.path.join(current_app.instance_path, 'thumbnail_backfill.json')
+        if restart and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        result = backfill(
+            current_app.config,
+            configured_sizes(current_app.config),
+            workers=workers,
+            in_flight=in_flight or max(1, workers * 2),
+            batch_size=batch_size,
+            checkpoint_path=checkpoint_path,
+            retry_failed=retry_failed,
+            limit=limit,
+            report=click.echo,
+            storage=get_blob_service() if workers == 0 else None
+        )
+        click.echo(f'Finished: {result.processed} processed, {result.failed} failed')
+
+    @thumbnails.command('adopt-legacy')
+    @click.option('--page-size', default=5000, show_default=True, help='Blobs per listing page')
+    def adopt_legacy(page_size):
+        """Mark images with a pre-rendition thumbnail as ready"""
+        from app.blob_service import get_blob_service
+        from app.page_cache import invalidate_gallery
+        from app.thumbnails import adopt_legacy_thumbnails
+
+        updated = adopt_legacy_thumbnails(get_blob_service(), page_size=page_size, report=click.echo)
+        if updated:
+            invalidate_gallery()
+        click.echo(f'Finished: {updated} images marked ready')
+
+    @thumbnails.command('work')
+    @click.option('--workers', default=None, type=int, help='Render processes (default THUMBNAIL_WORKERS)')
+    @click.option('--in-flight', default=None, type=int, help='Max jobs claimed at once (default 2 x workers)')
+    def work_thumbnails(workers, in_flight):
+        """Render queued thumbnail jobs until interrupted"""
+        from app.thumbnail_queue import ThumbnailWorker
+
+        worker = ThumbnailWorker(current_app._get_current_object(), workers=workers, in_flight=in_flight)
+
+        # finish the jobs in flight, then exit
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: worker.stop())
+
+        click.echo(f'Rendering thumbnails with {worker.workers} processes, Ctrl+C to stop')
+        worker.run()
+        click.echo('Stopped')
+
+    @app.cli.group('storage')
+    def storage():
+        """Storage maintenance"""
+
+    @storage.command('reconcile')
+    @click.option('--dry-run', is_flag=True, help='Only report orphans, delete nothing')
+    @click.option('--container', 'container_name', default=None,
+                  help='Only walk this container (default originals, then thumbnails)')
+    @click.option('--grace-hours', default=24, show_default=True,
+                  help='Leave blobs younger than this alone')
+    @click.option('--page-size', default=5000, show_default=True, help='Blobs per listing page')
+    def reconcile_storage(dry_run, container_name, grace_hours, page_size):
+        """Delete blobs that no image refers to"""
+        from app.blob_service import get_blob_service
+        from app.reconcile import reconcile
+
+        reports = reconcile(
+            get_blob_service(),
+            containers=[container_name] if container_name else None,
+            dry_run=dry_run,
+            grace_seconds=grace_hours * 3600,
+            page_size=page_size,
+            report=click.echo
+        )
+        for report in reports:
+            click.echo(f'Finished {report}{" (dry run)" if dry_run else ""}')
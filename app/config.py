@@ -18,21 +18,101 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    # Database connection pool settings
+    # Database connection pool settings, per worker process
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
+        'pool_size': DB_POOL_SIZE,
         'pool_recycle': 3600,      # recycle connections after 1 hour
         'pool_pre_ping': True,     # test connection before use
-        'max_overflow': 20,
+        'max_overflow': DB_MAX_OVERFLOW,
         'pool_timeout': 30,
     }
 
+    # Read replicas (comma-separated URLs) serving gallery, search and user lookups.
+    # A browser that wrote reads from the primary for DATABASE_REPLICA_PIN_SECONDS
+    DATABASE_REPLICA_URLS = [
+        url.strip().replace('postgres://', 'postgresql://', 1)
+        for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+    ]
+    DB_REPLICA_POOL_SIZE = int(os.environ.get('DB_REPLICA_POOL_SIZE', 10))  # per replica
+    DB_REPLICA_MAX_OVERFLOW = int(os.environ.get('DB_REPLICA_MAX_OVERFLOW', 20))
+    DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 10))
+
+    # Logged-in user identities cached per worker to skip the per-request lookup
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+
+    # Storage backend: azure (Blob Storage) or local (files on this machine)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'azure')
+
+    # Local storage: blob root, URL prefix of served files and offload to the front-end server
+    LOCAL_STORAGE_PATH = os.environ.get('LOCAL_STORAGE_PATH') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'storage')
+    MEDIA_URL = os.environ.get('MEDIA_URL', '/media')
+    MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT')  # nginx internal location mapped onto LOCAL_STORAGE_PATH
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'  # Apache/lighttpd
+    MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 31536000))  # blob names never change
+
     # Azure Blob Storage config
     AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
     AZURE_STORAGE_CONTAINER_ORIGINAL = os.environ.get('AZURE_STORAGE_CONTAINER_ORIGINAL', 'originals')
     AZURE_STORAGE_CONTAINER_THUMBNAIL = os.environ.get('AZURE_STORAGE_CONTAINER_THUMBNAIL', 'thumbnails')
+    AZURE_STORAGE_POOL_MAXSIZE = int(os.environ.get('AZURE_STORAGE_POOL_MAXSIZE', 20))  # keep-alive connections per worker
+
+    # Read SAS URLs stay the same for a bucket window, then get reissued
+    SAS_BUCKET_MINUTES = int(os.environ.get('SAS_BUCKET_MINUTES', 60))
+    SAS_VALIDITY_HOURS = int(os.environ.get('SAS_VALIDITY_HOURS', 24))  # min lifetime left at reissue
+    SAS_CACHE_SIZE = int(os.environ.get('SAS_CACHE_SIZE', 10000))
+
+    # Gallery config
+    GALLERY_PAGE_SIZE = int(os.environ.get('GALLERY_PAGE_SIZE', 24))
+
+    # Rendered gallery page cache: memory (per worker), sqlite (shared file) or none
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+    PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH')  # sqlite file, default instance/page_cache.db
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+
+    # Thumbnail renditions, keep in sync with the function's THUMBNAIL_SIZES
+    THUMBNAIL_SIZES = os.environ.get('THUMBNAIL_SIZES', '150,400,1200')
+    THUMBNAIL_MAX_PIXELS = int(os.environ.get('THUMBNAIL_MAX_PIXELS', 50_000_000))
+
+    # In-app thumbnail pipeline: uploads queue jobs in the database, a process pool renders them.
+    # Run `flask thumbnails work`, or set THUMBNAIL_WORKER_IN_APP for single-process deployments
+    THUMBNAIL_QUEUE = os.environ.get('THUMBNAIL_QUEUE', 'false').lower() == 'true'
+    THUMBNAIL_WORKER_IN_APP = os.environ.get('THUMBNAIL_WORKER_IN_APP', 'false').lower() == 'true'
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+    THUMBNAIL_QUEUE_MAX = int(os.environ.get('THUMBNAIL_QUEUE_MAX', 1000))  # uploads past this wait for a backfill
+    THUMBNAIL_JOB_ATTEMPTS = int(os.environ.get('THUMBNAIL_JOB_ATTEMPTS', 5))
+    THUMBNAIL_JOB_RETRY_SECONDS = int(os.environ.get('THUMBNAIL_JOB_RETRY_SECONDS', 5))  # doubled per attempt
+    THUMBNAIL_JOB_LEASE_SECONDS = int(os.environ.get('THUMBNAIL_JOB_LEASE_SECONDS', 300))  # then reclaimed
+    THUMBNAIL_QUEUE_POLL_SECONDS = float(os.environ.get('THUMBNAIL_QUEUE_POLL_SECONDS', 0.5))
+
+    # Shared secret the thumbnail function sends with status callbacks
+    THUMBNAIL_CALLBACK_TOKEN = os.environ.get('THUMBNAIL_CALLBACK_TOKEN')
+
+    # Instrumentation: Server-Timing header and optional bearer token for /metrics
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
     # File upload config
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # max upload size 16MB
+
+    # Chunked uploads: files above the single-put size go up as parallel blocks
+    BLOB_UPLOAD_BLOCK_SIZE = int(os.environ.get('BLOB_UPLOAD_BLOCK_SIZE', 4 * 1024 * 1024))
+    BLOB_MAX_SINGLE_PUT_SIZE = int(os.environ.get('BLOB_MAX_SINGLE_PUT_SIZE', 4 * 1024 * 1024))
+    BLOB_UPLOAD_MAX_CONCURRENCY = int(os.environ.get('BLOB_UPLOAD_MAX_CONCURRENCY', 4))
+
+    # Batch uploads: files per batch and parallel blob transfers
+    BATCH_UPLOAD_MAX_FILES = int(os.environ.get('BATCH_UPLOAD_MAX_FILES', 50))
+    BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', 4))
+    # request body limit of the batch routes, MAX_CONTENT_LENGTH still applies per file
+    BATCH_UPLOAD_MAX_CONTENT_LENGTH = int(os.environ.get(
+        'BATCH_UPLOAD_MAX_CONTENT_LENGTH', BATCH_UPLOAD_MAX_FILES * MAX_CONTENT_LENGTH))
+
+    # Direct uploads: browser PUTs to storage with a short-lived write SAS
+    DIRECT_UPLOADS = os.environ.get('DIRECT_UPLOADS', 'false').lower() == 'true'
+    DIRECT_UPLOAD_SAS_MINUTES = int(os.environ.get('DIRECT_UPLOAD_SAS_MINUTES', 15))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
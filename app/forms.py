@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileRequired, FileAllowed
+from flask_wtf.file import FileField, FileRequired, FileAllowed, MultipleFileField
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField
 from wtforms.validators import DataRequired, Length, EqualTo, ValidationError, Optional
 from app.models import User
@@ -61,3 +61,21 @@ class UploadForm(FlaskForm):
 
     submit = SubmitField('Upload')
 
+
+
+class BatchUploadForm(FlaskForm):
+    """Multi-image upload form"""
+    images = MultipleFileField('Choose Images',
+                              validators=[
+                                  FileRequired(message='Please select at least one image'),
+                                  FileAllowed(['png', 'jpg', 'jpeg', 'gif', 'webp'],
+                                              message='Only image files are allowed (PNG, JPG, GIF, WebP)')
+                              ])
+
+    caption = TextAreaField('Caption for all images (Optional)',
+                          validators=[
+                              Optional(),
+                              Length(max=200, message='Caption must be less than 200 characters')
+                          ])
+
+    submit = SubmitField('Upload All')
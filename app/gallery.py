@@ -0,0 +1,244 @@
+"""Gallery listing helpers with keyset pagination"""
+
+import base64
+import binascii
+import os
+from datetime import datetime
+from sqlalchemy import and_, or_
+from app.models import db, Image, User
+from app.search import caption_filter
+
+# <img sizes> hint matching the gallery grid column width
+THUMBNAIL_SIZES_ATTR = '(max-width: 768px) 50vw, 300px'
+
+# rendition file extensions, must match functions/thumbnail_generator/renditions.py
+RENDITION_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def rendition_name(blob_name, size, fmt):
+    """
+    Blob name of one thumbnail rendition
+
+    Args:
+        blob_name: Original blob name
+        size: Bounding box edge in pixels
+        fmt: 'WEBP' or 'JPEG'
+
+    Returns:
+        str: e.g. "400/<uuid>.webp"
+    """
+    stem = os.path.splitext(blob_name)[0]
+    return f"{size}/{stem}.{RENDITION_EXTENSIONS[fmt]}"
+
+
+class GalleryItem:
+    """Lightweight read-only view of one gallery image"""
+
+    __slots__ = ('id', 'caption', 'blob_name', 'upload_date', 'uploader',
+                 'thumbnail_status', 'thumbnail_sizes', 'thumbnail_widths', 'placeholder', 'aspect_ratio',
+                 'thumbnail_url', 'original_url', 'srcset_webp', 'srcset_jpeg', 'display_url')
+
+    def __init__(self, id, caption, blob_name, upload_date, uploader, thumbnail_status,
+                 thumbnail_sizes=None, thumbnail_widths=None, placeholder=None, aspect_ratio=None):
+        self.id = id
+        self.caption = caption or ''
+        self.blob_name = blob_name
+        self.upload_date = upload_date
+        self.uploader = uploader
+        self.thumbnail_status = thumbnail_status
+        self.thumbnail_sizes = [int(size) for size in thumbnail_sizes.split(',')] if thumbnail_sizes else []
+        self.thumbnail_widths = [int(width) for width in thumbnail_widths.split(',')] if thumbnail_widths else []
+        self.placeholder = placeholder
+        self.aspect_ratio = aspect_ratio
+        self.thumbnail_url = None
+        self.original_url = None
+        self.srcset_webp = None
+        self.srcset_jpeg = None
+        self.display_url = None
+
+    @property
+    def has_thumbnail(self):
+        """Whether the thumbnail blob has been written"""
+        return self.thumbnail_status == Image.THUMBNAIL_READY
+
+    def renditions(self):
+        """
+        (size, width) of each rendition worth listing in a srcset
+
+        Sizes above the source's width render at the source's width, so
+        only the smallest size per width is kept. Rows rendered before
+        widths were recorded fall back to the box size.
+        """
+        if len(self.thumbnail_widths) != len(self.thumbnail_sizes):
+            return [(size, size) for size in self.thumbnail_sizes]
+        candidates = []
+        for size, width in zip(self.thumbnail_sizes, self.thumbnail_widths):
+            if not candidates or width > candidates[-1][1]:
+                candidates.append((size, width))
+        return candidates
+
+    def to_dict(self):
+        """Compact record for the JSON feed"""
+        return {
+            'id': self.id,
+            'caption': self.caption,
+            'uploader': self.uploader,
+            'upload_date': self.upload_date.strftime('%Y-%m-%d %H:%M'),
+            'thumbnail_url': self.thumbnail_url,
+            'original_url': self.original_url,
+            'srcset_webp': self.srcset_webp,
+            'srcset_jpeg': self.srcset_jpeg,
+            'display_url': self.display_url,
+            'placeholder': self.placeholder,
+            'aspect_ratio': self.aspect_ratio
+        }
+
+
+def encode_cursor(upload_date, image_id):
+    """
+    Encode the position after an image as an opaque cursor
+
+    Args:
+        upload_date: Upload date of the last image on the page
+        image_id: ID of the last image on the page
+
+    Returns:
+        URL-safe cursor string
+    """
+    raw = f"{upload_date.isoformat()}|{image_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor
+
+    Args:
+        cursor: Cursor string
+
+    Returns:
+        tuple: (upload_date, image_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        date_part, id_part = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def fetch_page(cursor=None, page_size=24, user_id=None, search=None):
+    """
+    Fetch one gallery page, newest first
+
+    Seeks past the cursor on (upload_date, id) so every page costs the
+    same no matter how deep the user scrolls. Only the columns the
+    gallery shows are selected, with the uploader joined in, so a page
+    is a single query.
+
+    Args:
+        cursor: Cursor from the previous page, or None for the first page
+        page_size: Images per page
+        user_id: Only this user's images, served by the (user_id, upload_date) index
+        search: Only images whose caption matches these words (see search_terms)
+
+    Returns:
+        tuple: (items, next_cursor) where items are GalleryItem objects
+               and next_cursor is None on the last page
+    """
+    query = db.session.query(
+        Image.id,
+        Image.caption,
+        Image.blob_name,
+        Image.upload_date,
+        User.username,
+        Image.thumbnail_status,
+        Image.thumbnail_sizes,
+        Image.thumbnail_widths,
+        Image.placeholder,
+        Image.aspect_ratio
+    ).join(User, Image.user_id == User.id)
+
+    if user_id is not None:
+        query = query.filter(Image.user_id == user_id)
+    if search:
+        query = query.filter(caption_filter(search, db.session.get_bind().dialect.name))
+
+    if cursor:
+        upload_date, image_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Image.upload_date < upload_date,
+            and_(Image.upload_date == upload_date, Image.id < image_id)
+        ))
+
+    # one extra row tells us whether another page exists
+    rows = query.order_by(Image.upload_date.desc(), Image.id.desc()).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.upload_date, last.id)
+
+    return [GalleryItem(*row) for row in rows], next_cursor
+
+
+def attach_urls(items, blob_service):
+    """
+    Sign the original and thumbnail URLs for a page of items
+
+    Items with renditions get WebP and JPEG srcsets plus a display URL
+    for the modal (the largest JPEG). Older rows with a single thumbnail
+    fall back to the legacy thumbnails/<blob_name> blob.
+
+    Args:
+        items: GalleryItem objects
+        blob_service: Storage service used to sign URLs
+
+    Returns:
+        list: The same items, with URLs set
+    """
+    original_urls = blob_service.sign_many([item.blob_name for item in items])
+
+    # Thumbnail state comes from the DB, no storage round trip
+    thumbnail_names = []
+    for item in items:
+        if not item.has_thumbnail:
+            continue
+        if item.thumbnail_sizes:
+            for size, _ in item.renditions():
+                thumbnail_names.append(rendition_name(item.blob_name, size, 'WEBP'))
+                thumbnail_names.append(rendition_name(item.blob_name, size, 'JPEG'))
+        else:
+            thumbnail_names.append(item.blob_name)
+    thumbnail_urls = blob_service.sign_many(thumbnail_names, blob_service.container_thumbnail)
+
+    for item in items:
+        item.original_url = original_urls[item.blob_name]
+        item.thumbnail_url = item.original_url
+        item.display_url = item.original_url
+
+        if not item.has_thumbnail:
+            continue
+
+        if not item.thumbnail_sizes:
+            item.thumbnail_url = thumbnail_urls[item.blob_name]
+            continue
+
+        renditions = item.renditions()
+        item.srcset_webp = ', '.join(
+            f"{thumbnail_urls[rendition_name(item.blob_name, size, 'WEBP')]} {width}w"
+            for size, width in renditions
+        )
+        item.srcset_jpeg = ', '.join(
+            f"{thumbnail_urls[rendition_name(item.blob_name, size, 'JPEG')]} {width}w"
+            for size, width in renditions
+        )
+        item.thumbnail_url = thumbnail_urls[rendition_name(item.blob_name, renditions[0][0], 'JPEG')]
+        item.display_url = thumbnail_urls[rendition_name(item.blob_name, renditions[-1][0], 'JPEG')]
+
+    return items
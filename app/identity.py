@@ -0,0 +1,81 @@
+"""Cached identity lookups for Flask-Login"""
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from app.cache import LRUCache
+from app.models import db, User
+from app.replicas import replica_reads
+
+
+class CachedUser(UserMixin):
+    """Detached user identity with only the fields requests need"""
+
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def init_user_cache(app):
+    """
+    Attach the per-worker identity cache
+
+    Args:
+        app: Flask app
+    """
+    app.extensions['user_cache'] = LRUCache(
+        maxsize=app.config['USER_CACHE_SIZE'],
+        ttl=app.config['USER_CACHE_TTL']
+    )
+
+
+def load_cached_user(user_id):
+    """
+    Load a user identity, hitting the DB only on a cache miss
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        CachedUser or None if the user does not exist
+    """
+    cache = current_app.extensions.get('user_cache')
+    if cache is not None:
+        user = cache.get(user_id)
+        if user is not None:
+            return user
+
+    with replica_reads():
+        row = db.session.query(User.id, User.username).filter(User.id == user_id).first()
+    if row is None:
+        return None
+
+    user = CachedUser(row.id, row.username)
+    if cache is not None:
+        cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    """
+    Drop a cached identity after the user changes
+
+    Args:
+        user_id: User ID
+    """
+    if not has_app_context():
+        return
+    cache = current_app.extensions.get('user_cache')
+    if cache is not None:
+        cache.delete(user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
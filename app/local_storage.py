@@ -0,0 +1,248 @@
+"""Local filesystem storage for single-node and self-hosted deployments
+
+Blobs are plain files under <root>/<container>/<aa>/<bb>/<blob name>,
+where aa/bb come from a hash of the name so no directory grows past a
+few thousand entries. They are served by the /media route, which hands
+the copying to the front-end server or the WSGI server's sendfile.
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import quote
+from werkzeug.security import safe_join
+from app.metrics import timed
+from app.storage import BlobNotFoundError, StorageService
+
+
+class LocalStorageService(StorageService):
+    """Storage service that keeps blobs on local disk"""
+
+    def __init__(self, root, container_original='originals', container_thumbnail='thumbnails',
+                 url_prefix='/media', chunk_size=1024 * 1024):
+        """
+        Init local storage
+
+        Args:
+            root: Directory holding one subdirectory per container
+            container_original: Original images container
+            container_thumbnail: Thumbnails container
+            url_prefix: Prefix of generated URLs, the /media route or a
+                        front-end server location mapped onto root
+            chunk_size: Bytes copied per step when writing a stream
+        """
+        self.root = os.path.abspath(root)
+        self.container_original = container_original
+        self.container_thumbnail = container_thumbnail
+        self.url_prefix = url_prefix.rstrip('/')
+        self.chunk_size = chunk_size
+
+    def relative_path(self, container_name, blob_name):
+        """
+        Path of a blob below root, with "/" separators
+
+        Args:
+            container_name: Container name
+            blob_name: Blob name, may contain "/"
+
+        Returns:
+            str: e.g. "originals/3f/a2/<uuid>.jpg"
+
+        Raises:
+            ValueError: For unknown containers or names that escape the container
+        """
+        if container_name not in (self.container_original, self.container_thumbnail):
+            raise ValueError(f"Unknown container: {container_name}")
+        parts = blob_name.split('/')
+        if '\\' in blob_name or any(part in ('', '.', '..') or part.startswith('.') for part in parts):
+            raise ValueError(f"Invalid blob name: {blob_name}")
+
+        digest = hashlib.md5(blob_name.encode('utf-8')).hexdigest()
+        return f"{container_name}/{digest[:2]}/{digest[2:4]}/{blob_name}"
+
+    def path_for(self, container_name, blob_name):
+        """
+        Absolute file path of a blob
+
+        Raises:
+            ValueError: For unknown containers or names that escape the container
+        """
+        path = safe_join(self.root, self.relative_path(container_name, blob_name))
+        if path is None:
+            raise ValueError(f"Invalid blob name: {blob_name}")
+        return path
+
+    def _write(self, path, source):
+        """
+        Write bytes or a stream to path atomically
+
+        Data goes to a hidden temp file in the target directory and is
+        renamed into place, so readers never see a partial file.
+        """
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    out.write(source)
+                else:
+                    shutil.copyfileobj(source, out, self.chunk_size)
+                out.flush()
+                os.fsync(out.fileno())
+            # mkstemp creates 0600, the front-end server must be able to read it
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def ensure_containers(self):
+        """Create the container directories if missing"""
+        for container_name in (self.container_original, self.container_thumbnail):
+            os.makedirs(os.path.join(self.root, container_name), exist_ok=True)
+
+    @timed('upload_file')
+    def upload_file(self, file_stream, original_filename, content_type='image/jpeg', length=None):
+        """
+        Store an uploaded original
+
+        Args:
+            file_stream: File stream
+            original_filename: Original filename
+            content_type: File MIME type, implied by the extension on read
+            length: Unused, the stream is copied until EOF
+
+        Returns:
+            dict: Contains blob_name and url
+        """
+        try:
+            blob_name = self._generate_unique_filename(original_filename)
+            self._write(self.path_for(self.container_original, blob_name), file_stream)
+            return {
+                'success': True,
+                'blob_name': blob_name,
+                'url': self.generate_download_url(blob_name)
+            }
+
+        except Exception as e:
+            print(f"Upload error: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    @timed('get_blob_properties')
+    def get_blob_properties(self, blob_name, container_name=None):
+        """
+        Size and content type of a stored blob
+
+        Returns:
+            dict: size and content_type, or None if the blob does not exist
+        """
+        try:
+            size = os.stat(self.path_for(container_name or self.container_original, blob_name)).st_size
+        except (OSError, ValueError):
+            return None
+        return {
+            'size': size,
+            'content_type': mimetypes.guess_type(blob_name)[0] or 'application/octet-stream'
+        }
+
+    def generate_download_url(self, blob_name, container_name=None, expiry_hours=None):
+        """
+        URL of a blob below url_prefix
+
+        Names are UUIDs, so URLs never change and need no signing.
+        """
+        return f"{self.url_prefix}/{container_name or self.container_original}/{quote(blob_name)}"
+
+    def sign_many(self, blob_names, container_name=None):
+        """URLs for many blobs of one container"""
+        container_name = container_name or self.container_original
+        return {name: self.generate_download_url(name, container_name) for name in blob_names}
+
+    @timed('download_file')
+    def download_file(self, blob_name, container_name=None):
+        """Blob content as bytes"""
+        try:
+            with open(self.path_for(container_name or self.container_original, blob_name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError as e:
+            raise BlobNotFoundError(blob_name) from e
+
+    @timed('upload_bytes')
+    def upload_bytes(self, data, blob_name, container_name=None, content_type='application/octet-stream',
+                     cache_control=None):
+        """
+        Write a blob under a given name, thumbnails container by default
+
+        content_type and cache_control are decided when the file is
+        served, they are accepted for interface compatibility.
+        """
+        self._write(self.path_for(container_name or self.container_thumbnail, blob_name), data)
+
+    @timed('delete_file')
+    def delete_file(self, blob_name, container_name=None):
+        """
+        Delete one blob
+
+        Returns:
+            bool: Whether a file was deleted
+        """
+        try:
+            os.remove(self.path_for(container_name or self.container_original, blob_name))
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"Delete error: {e}")
+            return False
+
+    def list_blobs(self, container_name=None, page_size=5000):
+        """
+        Walk a container page by page
+
+        Hidden files (writes in progress) are skipped. Order follows the
+        shard directories, not blob names.
+
+        Args:
+            container_name: Container name (default: originals)
+            page_size: Max blobs per page
+
+        Yields:
+            list: (blob_name, last_modified) tuples
+        """
+        container_name = container_name or self.container_original
+        if container_name not in (self.container_original, self.container_thumbnail):
+            raise ValueError(f"Unknown container: {container_name}")
+        container_root = os.path.join(self.root, container_name)
+
+        page = []
+        for directory, subdirs, files in os.walk(container_root):
+            subdirs[:] = sorted(d for d in subdirs if not d.startswith('.'))
+            parts = os.path.relpath(directory, container_root).split(os.sep)
+            # files live below <aa>/<bb>, whatever is above that is shard
+            if len(parts) < 2 or parts[0] == '.':
+                continue
+            prefix = '/'.join(parts[2:])
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                try:
+                    mtime = os.stat(os.path.join(directory, name)).st_mtime
+                except FileNotFoundError:
+                    continue
+                blob_name = f"{prefix}/{name}" if prefix else name
+                page.append((blob_name, datetime.fromtimestamp(mtime, tz=timezone.utc)))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
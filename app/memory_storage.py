@@ -0,0 +1,134 @@
+"""In-memory storage service for tests, benchmarks and offline development"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from app.metrics import timed
+from app.storage import BlobNotFoundError, StorageService
+
+
+class InMemoryStorageService(StorageService):
+    """
+    Drop-in stand-in for BlobStorageService that keeps blobs in a dict
+
+    Every call can be slowed down by a fixed latency to mimic storage
+    round trips, e.g. latency={'upload_file': 0.05}.
+    """
+
+    supports_direct_upload = True
+
+    def __init__(self, container_original='originals', container_thumbnail='thumbnails',
+                 latency=None, base_url='memory://storage'):
+        """
+        Init in-memory storage
+
+        Args:
+            container_original: Original images container
+            container_thumbnail: Thumbnails container
+            latency: Seconds added per call, either one number for every
+                     operation or a dict of operation name -> seconds
+            base_url: Prefix used for generated URLs
+        """
+        self.container_original = container_original
+        self.container_thumbnail = container_thumbnail
+        self.latency = latency or 0
+        self.base_url = base_url.rstrip('/')
+        self.blobs = {container_original: {}, container_thumbnail: {}}
+        self.modified = {}  # (container, blob name) -> last write, UTC
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = self.latency.get(operation, 0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def ensure_containers(self):
+        """Containers always exist in memory"""
+        for container_name in (self.container_original, self.container_thumbnail):
+            self.blobs.setdefault(container_name, {})
+
+    def put_blob(self, container_name, blob_name, data, content_type='application/octet-stream'):
+        """Store a blob directly, e.g. to seed thumbnails"""
+        with self._lock:
+            self.blobs.setdefault(container_name, {})[blob_name] = (data, content_type)
+            self.modified[container_name, blob_name] = datetime.now(timezone.utc)
+
+    @timed('upload_file')
+    def upload_file(self, file_stream, original_filename, content_type='image/jpeg', length=None):
+        self._call('upload_file')
+        blob_name = self._generate_unique_filename(original_filename)
+        self.put_blob(self.container_original, blob_name, file_stream.read(), content_type)
+        return {
+            'success': True,
+            'blob_name': blob_name,
+            'url': f"{self.base_url}/{self.container_original}/{blob_name}"
+        }
+
+    @timed('generate_upload_url')
+    def generate_upload_url(self, original_filename, expiry_minutes=15):
+        self._call('generate_upload_url')
+        blob_name = self._generate_unique_filename(original_filename)
+        return {
+            'blob_name': blob_name,
+            'upload_url': f"{self.base_url}/{self.container_original}/{blob_name}?upload"
+        }
+
+    @timed('get_blob_properties')
+    def get_blob_properties(self, blob_name, container_name=None):
+        self._call('get_blob_properties')
+        blob = self.blobs.get(container_name or self.container_original, {}).get(blob_name)
+        if blob is None:
+            return None
+        return {'size': len(blob[0]), 'content_type': blob[1]}
+
+    @timed('generate_download_url')
+    def generate_download_url(self, blob_name, container_name=None, expiry_hours=None):
+        self._call('generate_download_url')
+        return f"{self.base_url}/{container_name or self.container_original}/{blob_name}"
+
+    @timed('sign_many')
+    def sign_many(self, blob_names, container_name=None):
+        self._call('sign_many')
+        container_name = container_name or self.container_original
+        return {name: f"{self.base_url}/{container_name}/{name}" for name in blob_names}
+
+    def thumbnail_url_for(self, original_blob_name):
+        return self.generate_download_url(original_blob_name, self.container_thumbnail)
+
+    @timed('get_thumbnail_url')
+    def get_thumbnail_url(self, original_blob_name):
+        self._call('get_thumbnail_url')
+        if original_blob_name in self.blobs[self.container_thumbnail]:
+            return self.thumbnail_url_for(original_blob_name)
+        return None
+
+    @timed('download_file')
+    def download_file(self, blob_name, container_name=None):
+        self._call('download_file')
+        try:
+            return self.blobs[container_name or self.container_original][blob_name][0]
+        except KeyError as e:
+            raise BlobNotFoundError(blob_name) from e
+
+    @timed('upload_bytes')
+    def upload_bytes(self, data, blob_name, container_name=None, content_type='application/octet-stream',
+                     cache_control=None):
+        self._call('upload_bytes')
+        self.put_blob(container_name or self.container_thumbnail, blob_name, data, content_type)
+
+    @timed('delete_file')
+    def delete_file(self, blob_name, container_name=None):
+        self._call('delete_file')
+        with self._lock:
+            return self.blobs.get(container_name or self.container_original, {}).pop(blob_name, None) is not None
+
+    def list_blobs(self, container_name=None, page_size=5000):
+        self._call('list_blobs')
+        container_name = container_name or self.container_original
+        with self._lock:
+            names = sorted(self.blobs.get(container_name, {}))
+        for start in range(0, len(names), page_size):
+            yield [(name, self.modified[container_name, name]) for name in names[start:start + page_size]]
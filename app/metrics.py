@@ -0,0 +1,212 @@
+"""Request-level performance instrumentation
+
+Timings are kept per worker process: each request gets a Server-Timing
+header, and /metrics exposes latency histograms in Prometheus text
+format.
+"""
+
+import functools
+import threading
+import time
+from flask import g, has_request_context, request, current_app, abort, Response, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# metric name -> help text, in exposition order
+METRICS = {
+    'http_request_duration_seconds': 'Request latency by route',
+    'db_query_duration_seconds': 'SQL statement latency',
+    'storage_operation_duration_seconds': 'Storage service call latency by operation',
+    'template_render_duration_seconds': 'Jinja template render latency',
+    'password_check_duration_seconds': 'Password hash verification latency',
+    'thumbnail_job_duration_seconds': 'In-app thumbnail job latency from claim to result',
+}
+
+
+class Histogram:
+    """Labelled latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, labels=()):
+        """
+        Record one observation
+
+        Args:
+            seconds: Observed duration
+            labels: Tuple of (name, value) pairs
+        """
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def expose(self, name):
+        """Prometheus text lines for this histogram"""
+        lines = []
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {bucket_count}')
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+_histograms = {name: Histogram() for name in METRICS}
+
+# extra text lines from other modules, e.g. queue depth gauges
+_collectors = []
+
+
+def register_collector(collector):
+    """
+    Add a callable returning extra Prometheus text lines for /metrics
+
+    Args:
+        collector: Function taking no arguments and returning a list of lines
+    """
+    _collectors.append(collector)
+
+
+def record(metric, seconds, labels=(), timing=None):
+    """
+    Record a duration in a histogram and the current request's timings
+
+    Args:
+        metric: Histogram name from METRICS
+        seconds: Duration
+        labels: Tuple of (name, value) pairs
+        timing: Server-Timing entry to add the duration to, if any
+    """
+    _histograms[metric].observe(seconds, labels)
+
+    if timing and has_request_context():
+        timings = g.setdefault('_timings', {})
+        total, count = timings.get(timing, (0.0, 0))
+        timings[timing] = (total + seconds, count + 1)
+
+
+def timed(operation):
+    """
+    Decorator timing a storage service method
+
+    Args:
+        operation: Operation label, e.g. 'upload_file'
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record('storage_operation_duration_seconds', time.perf_counter() - start,
+                       (('operation', operation),), timing='storage')
+        return wrapper
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['_query_start'].pop()
+    record('db_query_duration_seconds', time.perf_counter() - start, timing='db')
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('_render_start', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    starts = g.get('_render_start')
+    if starts:
+        record('template_render_duration_seconds', time.perf_counter() - starts.pop(),
+               (('template', template.name),), timing='render')
+
+
+def _server_timing(timings, total):
+    entries = []
+    for name, (seconds, count) in timings.items():
+        entries.append(f'{name};dur={seconds * 1000:.1f};desc="{count} calls"')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_metrics(app):
+    """
+    Wire request timing, template signals and the /metrics endpoint
+
+    Args:
+        app: Flask app
+    """
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_timer():
+        g._request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_request_timer(response):
+        start = g.pop('_request_start', None)
+        if start is None:
+            return response
+
+        total = time.perf_counter() - start
+        record('http_request_duration_seconds', total, (
+            ('route', request.url_rule.rule if request.url_rule else 'unmatched'),
+            ('method', request.method),
+            ('status', response.status_code),
+        ))
+
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = _server_timing(g.get('_timings', {}), total)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics for this worker"""
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+
+        lines = []
+        for name, help_text in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            lines.extend(_histograms[name].expose(name))
+        for collector in _collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                current_app.logger.error(f'Metrics collector error: {e}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -2,9 +2,16 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import time
+import sqlalchemy.dialects.postgresql  # registers to_tsvector for the caption search index
+from app.metrics import record
+from app.replicas import RoutingSession
 
-# database object
-db = SQLAlchemy()
+# database object, read-only routes may be served by replicas (see app.replicas)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# text search configuration of the PostgreSQL caption index and queries
+CAPTION_SEARCH_CONFIG = db.literal_column("'english'::regconfig")
 
 class User(UserMixin, db.Model):
     """User account model"""
@@ -22,7 +29,11 @@ class User(UserMixin, db.Model):
 
     def check_password(self, password):
         """Verify password"""
-        return check_password_hash(self.password_hash, password)
+        start = time.perf_counter()
+        try:
+            return check_password_hash(self.password_hash, password)
+        finally:
+            record('password_check_duration_seconds', time.perf_counter() - start, timing='hash')
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -32,12 +43,131 @@ class Image(db.Model):
     """Pet photo model"""
     __tablename__ = 'images'
 
+    # thumbnail states, set by the thumbnail function callback
+    THUMBNAIL_PENDING = 'pending'
+    THUMBNAIL_READY = 'ready'
+    THUMBNAIL_FAILED = 'failed'
+    THUMBNAIL_STATUSES = (THUMBNAIL_PENDING, THUMBNAIL_READY, THUMBNAIL_FAILED)
+
     id = db.Column(db.Integer, primary_key=True)
     caption = db.Column(db.String(200))
-    blob_name = db.Column(db.String(200), nullable=False)  # Store blob filename only
+    blob_name = db.Column(db.String(200), nullable=False, index=True)  # Store blob filename only
     upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    thumbnail_status = db.Column(db.String(20), nullable=False, default=THUMBNAIL_PENDING,
+                                 server_default=THUMBNAIL_PENDING)
+    thumbnail_width = db.Column(db.Integer)
+    thumbnail_height = db.Column(db.Integer)
+    thumbnail_sizes = db.Column(db.String(50))  # rendition sizes, e.g. "150,400,1200"
+    thumbnail_widths = db.Column(db.String(50))  # actual width of each size, e.g. "150,400,800"
+    content_hash = db.Column(db.String(64), index=True)  # sha256 of the original, hex
+    placeholder = db.Column(db.Text)  # tiny JPEG data URI painted before the thumbnail loads
+    aspect_ratio = db.Column(db.Float)  # width / height of the original
+
+    __table_args__ = (
+        # per-user gallery, newest first, with the id tie-break of the cursor
+        db.Index('ix_images_user_id_upload_date', 'user_id', 'upload_date', 'id'),
+        # caption search on PostgreSQL, SQLite uses the FTS5 table from app/search.py
+        db.Index(
+            'ix_images_caption_tsv',
+            db.func.to_tsvector(CAPTION_SEARCH_CONFIG, db.func.coalesce(caption, db.literal_column("''"))),
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
+    )
+
+    @property
+    def has_thumbnail(self):
+        """Whether the thumbnail blob has been written"""
+        return self.thumbnail_status == self.THUMBNAIL_READY
+
+    @classmethod
+    def by_content_hash(cls, hashes):
+        """
+        Find existing images for a set of content hashes
+
+        Args:
+            hashes: Iterable of hex sha256 digests
+
+        Returns:
+            dict: hash -> oldest Image with that hash
+        """
+        hashes = {h for h in hashes if h}
+        if not hashes:
+            return {}
+        found = {}
+        for image in cls.query.filter(cls.content_hash.in_(hashes)).order_by(cls.id):
+            found.setdefault(image.content_hash, image)
+        return found
+
+    def share_blob(self, other):
+        """Point this image at another image's blob and thumbnail state"""
+        self.blob_name = other.blob_name
+        self.content_hash = other.content_hash
+        self.thumbnail_status = other.thumbnail_status
+        self.thumbnail_width = other.thumbnail_width
+        self.thumbnail_height = other.thumbnail_height
+        self.thumbnail_sizes = other.thumbnail_sizes
+        self.thumbnail_widths = other.thumbnail_widths
+        self.placeholder = other.placeholder
+        self.aspect_ratio = other.aspect_ratio
 
     def __repr__(self):
         return f'<Image {self.id}: {self.caption}>'
 
+
+
+class GalleryState(db.Model):
+    """Single-row gallery version, bumped whenever gallery content changes"""
+    __tablename__ = 'gallery_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls):
+        """Current state, or an unsaved version 0 if none exists yet"""
+        state = db.session.get(cls, 1)
+        if state is None:
+            state = cls(id=1, version=0, updated_at=datetime(1970, 1, 1))
+        return state
+
+    @classmethod
+    def bump(cls):
+        """Increment the version and commit"""
+        updated = cls.query.filter_by(id=1).update({
+            cls.version: cls.version + 1,
+            cls.updated_at: datetime.utcnow()
+        })
+        if not updated:
+            db.session.add(cls(id=1, version=1, updated_at=datetime.utcnow()))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+class ThumbnailJob(db.Model):
+    """Pending render of one original blob for the in-app thumbnail workers"""
+    __tablename__ = 'thumbnail_jobs'
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'  # out of attempts, kept with last_error for inspection
+
+    id = db.Column(db.Integer, primary_key=True)
+    blob_name = db.Column(db.String(200), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_thumbnail_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    def __repr__(self):
+        return f'<ThumbnailJob {self.id}: {self.blob_name} {self.status}>'
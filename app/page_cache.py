@@ -0,0 +1,168 @@
+"""Rendered gallery fragment cache with pluggable backends"""
+
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from app.cache import LRUCache
+from app.models import GalleryState
+
+
+class MemoryCacheBackend:
+    """Per-process LRU backend, invalidation only reaches this worker"""
+
+    def __init__(self, maxsize=512):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite file backend shared by every worker on one host
+
+    A connection is opened per call so the backend is safe to use from
+    any thread or forked worker.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS page_cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT value FROM page_cache WHERE key = ? AND expires_at > ?',
+                (key, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO page_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), time.time() + ttl)
+                )
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM page_cache')
+        finally:
+            conn.close()
+
+
+def init_page_cache(app):
+    """
+    Attach the gallery page cache configured by PAGE_CACHE_BACKEND
+
+    Args:
+        app: Flask app
+    """
+    backend = app.config['PAGE_CACHE_BACKEND']
+
+    if backend == 'memory':
+        cache = MemoryCacheBackend(maxsize=app.config['PAGE_CACHE_SIZE'])
+    elif backend == 'sqlite':
+        path = app.config['PAGE_CACHE_PATH'] or os.path.join(app.instance_path, 'page_cache.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cache = SQLiteCacheBackend(path)
+    elif backend == 'none':
+        cache = None
+    else:
+        raise ValueError(f"Unknown PAGE_CACHE_BACKEND: {backend}")
+
+    app.extensions['page_cache'] = cache
+
+
+def get_page_cache():
+    """Page cache backend for the current app, or None when disabled"""
+    return current_app.extensions.get('page_cache')
+
+
+def cache_ttl(blob_service):
+    """
+    Seconds a rendered page may be cached
+
+    Never longer than PAGE_CACHE_TTL, and never past the point where the
+    signer rotates to new SAS URLs.
+
+    Args:
+        blob_service: Storage service used to sign the page's URLs
+
+    Returns:
+        float: TTL in seconds
+    """
+    ttl = current_app.config['PAGE_CACHE_TTL']
+    signer = getattr(blob_service, 'signer', None)
+    if signer is not None:
+        ttl = min(ttl, signer.seconds_until_rotation())
+    return ttl
+
+
+def sas_bucket(blob_service):
+    """Current SAS bucket of the storage service, 0 if it does not rotate URLs"""
+    signer = getattr(blob_service, 'signer', None)
+    return signer.current_bucket() if signer is not None else 0
+
+
+def urls_issued_at(blob_service):
+    """
+    When the current set of signed URLs started being handed out
+
+    Args:
+        blob_service: Storage service used to sign URLs
+
+    Returns:
+        datetime: Start of the current SAS bucket (UTC), or the epoch
+    """
+    signer = getattr(blob_service, 'signer', None)
+    if signer is None:
+        return datetime.fromtimestamp(0, tz=timezone.utc)
+    return datetime.fromtimestamp(signer.current_bucket() * signer.bucket_seconds, tz=timezone.utc)
+
+
+def invalidate_gallery():
+    """
+    Drop every cached gallery page after images change
+
+    Bumps the shared gallery version, which is part of every cache key
+    and ETag, so pages cached by other workers stop matching too.
+    """
+    try:
+        GalleryState.bump()
+    except Exception as e:
+        print(f"Error bumping gallery version: {e}")
+
+    cache = get_page_cache()
+    if cache is None:
+        return
+    try:
+        cache.clear()
+    except Exception as e:
+        print(f"Error clearing page cache: {e}")
@@ -0,0 +1,158 @@
+"""Find and remove blobs that no Image row refers to
+
+Containers are walked with paged listing, and each page is checked
+against the images table with a few IN queries, so the cost is one
+round trip per few hundred blobs rather than one per blob. Orphans
+go out through the storage service's batch delete.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from app.gallery import rendition_name, RENDITION_EXTENSIONS
+from app.models import Image
+
+# extensions an original can have, see allowed_file and _generate_unique_filename
+ORIGINAL_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# blob names per IN query, well under every database's parameter limit
+QUERY_CHUNK = 500
+
+
+class ContainerReport:
+    """Counters for one container"""
+
+    def __init__(self, container_name):
+        self.container_name = container_name
+        self.scanned = 0
+        self.orphans = 0
+        self.recent = 0  # orphans inside the grace period, left alone
+        self.deleted = 0
+
+    def __str__(self):
+        return (f"{self.container_name}: {self.scanned} scanned, {self.orphans} orphaned, "
+                f"{self.recent} too recent, {self.deleted} deleted")
+
+
+def referenced_blobs(blob_names):
+    """
+    Subset of blob_names that some Image row uses
+
+    Args:
+        blob_names: Original blob names
+
+    Returns:
+        set: Names with at least one Image row
+    """
+    blob_names = list(set(blob_names))
+    found = set()
+    for start in range(0, len(blob_names), QUERY_CHUNK):
+        chunk = blob_names[start:start + QUERY_CHUNK]
+        found.update(name for name, in Image.query.with_entities(Image.blob_name).filter(
+            Image.blob_name.in_(chunk)).distinct())
+    return found
+
+
+def original_candidates(thumbnail_name):
+    """
+    Original blob names a thumbnail may belong to
+
+    Renditions are "<size>/<stem>.<ext>" and only keep the original's
+    stem; legacy thumbnails carry the original's exact name.
+
+    Args:
+        thumbnail_name: Blob name in the thumbnails container
+
+    Returns:
+        list: Possible original blob names
+    """
+    if '/' not in thumbnail_name:
+        return [thumbnail_name]
+    stem = os.path.splitext(thumbnail_name.split('/', 1)[1])[0]
+    return [stem + ext for ext in ORIGINAL_EXTENSIONS]
+
+
+def image_blob_names(blob_name, sizes):
+    """
+    Every thumbnail blob an original may have
+
+    Args:
+        blob_name: Original blob name
+        sizes: Rendition sizes to cover
+
+    Returns:
+        list: Thumbnail blob names, renditions plus the legacy name
+    """
+    names = [rendition_name(blob_name, size, fmt) for size in sorted(set(sizes)) for fmt in RENDITION_EXTENSIONS]
+    names.append(blob_name)
+    return names
+
+
+def delete_image_blobs(storage, blob_name, sizes):
+    """
+    Delete an original and all of its thumbnails
+
+    Args:
+        storage: Storage service
+        blob_name: Original blob name
+        sizes: Rendition sizes that may exist
+
+    Returns:
+        int: Blobs deleted
+    """
+    deleted = 1 if storage.delete_file(blob_name) else 0
+    return deleted + storage.delete_many(image_blob_names(blob_name, sizes), storage.container_thumbnail)
+
+
+def reconcile(storage, containers=None, dry_run=False, grace_seconds=86400, page_size=5000, report=print):
+    """
+    Remove blobs no Image row refers to
+
+    Blobs modified within the grace period are never touched: they may
+    belong to an upload whose row is not committed yet, or to a
+    thumbnail rendered before its row was.
+
+    Args:
+        storage: Storage service
+        containers: Container names to walk, default originals then thumbnails
+        dry_run: Only count orphans
+        grace_seconds: Minimum age of a blob before it may be deleted
+        page_size: Blobs per listing page
+        report: Function receiving progress lines
+
+    Returns:
+        list: ContainerReport per container
+    """
+    if containers is None:
+        containers = (storage.container_original, storage.container_thumbnail)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    started = time.perf_counter()
+    reports = []
+
+    for container_name in containers:
+        result = ContainerReport(container_name)
+        reports.append(result)
+        thumbnails = container_name == storage.container_thumbnail
+
+        for page in storage.list_blobs(container_name, page_size):
+            result.scanned += len(page)
+
+            if thumbnails:
+                candidates = {name: original_candidates(name) for name, _ in page}
+                live = referenced_blobs(name for names in candidates.values() for name in names)
+                orphaned = [(name, modified) for name, modified in page
+                            if not any(candidate in live for candidate in candidates[name])]
+            else:
+                live = referenced_blobs(name for name, _ in page)
+                orphaned = [(name, modified) for name, modified in page if name not in live]
+
+            doomed = [name for name, modified in orphaned if modified < cutoff]
+            result.orphans += len(orphaned)
+            result.recent += len(orphaned) - len(doomed)
+
+            if doomed and not dry_run:
+                result.deleted += storage.delete_many(doomed, container_name)
+
+            report(f"{result} ({time.perf_counter() - started:.1f}s)")
+
+    return reports
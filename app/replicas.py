@@ -0,0 +1,136 @@
+"""Read-replica routing
+
+Replica URLs become extra Flask-SQLAlchemy binds ("replica_0", ...)
+that no model uses. Routes marked read_only send their queries to one
+replica, picked per request; everything else, every write and every
+query after a write in the same session, goes to the primary.
+
+A browser that just wrote is pinned to the primary for a few seconds
+via its session cookie, so a redirect to the gallery after an upload
+sees the new image even if the replicas lag behind.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+# session cookie key holding the time until which reads stay on the primary
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+
+def configure_replicas(config):
+    """
+    Add a bind per replica URL to the app config
+
+    Must run before db.init_app. Replicas get the primary's engine
+    options with their own pool size.
+
+    Args:
+        config: Flask app config
+    """
+    urls = config.get('DATABASE_REPLICA_URLS') or []
+    if not urls:
+        return
+
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    options['pool_size'] = config['DB_REPLICA_POOL_SIZE']
+    options['max_overflow'] = config['DB_REPLICA_MAX_OVERFLOW']
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for index, url in enumerate(urls):
+        binds[f'{REPLICA_BIND_PREFIX}{index}'] = dict(options, url=url)
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_replicas(app):
+    """
+    Pin browsers that wrote to the primary, if replicas are configured
+
+    Args:
+        app: Flask app
+    """
+    if not app.config.get('DATABASE_REPLICA_URLS'):
+        return
+
+    pin_seconds = app.config['DATABASE_REPLICA_PIN_SECONDS']
+
+    @app.after_request
+    def pin_to_primary(response):
+        db_session = current_app.extensions['sqlalchemy'].session
+        if db_session.registry.has() and db_session.info.get('wrote'):
+            session[PRIMARY_UNTIL_KEY] = int(time.time() + pin_seconds) + 1
+        return response
+
+
+def _pinned_to_primary():
+    if not has_request_context():
+        return False
+    return session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+@contextmanager
+def replica_reads():
+    """
+    Send the current session's reads to a replica inside the block
+
+    Does nothing without replicas or while the browser is pinned to
+    the primary. Writes still go to the primary.
+    """
+    db_session = current_app.extensions['sqlalchemy'].session
+    previous = db_session.info.get('read_only', False)
+    db_session.info['read_only'] = previous or not _pinned_to_primary()
+    try:
+        yield
+    finally:
+        db_session.info['read_only'] = previous
+
+
+def read_only(view):
+    """Route decorator: serve the route's queries from a replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session that sends read-only queries to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('read_only') and not self.info.get('wrote') \
+                and not self._flushing and not _is_write(clause):
+            engine = self._replica()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica(self):
+        """Replica engine of this session, picked once so a request sees one snapshot"""
+        if 'replica' not in self.info:
+            replicas = [engine for key, engine in self._db.engines.items()
+                        if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)]
+            self.info['replica'] = random.choice(replicas) if replicas else None
+        return self.info['replica']
+
+
+def _is_write(clause):
+    return isinstance(clause, UpdateBase) or getattr(clause, '_for_update_arg', None) is not None
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
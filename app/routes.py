@@ -1,12 +1,378 @@
-from flask import render_template, redirect, url_for, flash, request, current_app
+import hashlib
+import hmac
+import math
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from urllib.parse import quote
+from flask import Request, render_template, redirect, url_for, flash, request, current_app, jsonify, abort, session, send_file
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models import db, User, Image
-from app.forms import RegistrationForm, LoginForm, UploadForm
-from app.blob_service import BlobStorageService, allowed_file
+from flask_wtf.csrf import validate_csrf
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from wtforms.validators import ValidationError
+from app.models import db, User, Image, GalleryState, ThumbnailJob
+from app.forms import RegistrationForm, LoginForm, UploadForm, BatchUploadForm
+from app.blob_service import get_blob_service, allowed_file, content_hash, ALLOWED_CONTENT_TYPES
+from app.local_storage import LocalStorageService
+from app.gallery import fetch_page, attach_urls, THUMBNAIL_SIZES_ATTR
+from app.search import search_terms
+from app.replicas import read_only
+from app.page_cache import get_page_cache, cache_ttl, invalidate_gallery, sas_bucket, urls_issued_at
+from app import thumbnail_queue
+from app.reconcile import delete_image_blobs
+from app.thumbnails import configured_sizes
+
+# placeholders are inlined into every gallery page, refuse anything bulky
+MAX_PLACEHOLDER_LENGTH = 2048
+
+
+def _positive_int(value):
+    """Whether a JSON value is a positive integer (bools excluded)"""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+# routes whose request body is limited by BATCH_UPLOAD_MAX_CONTENT_LENGTH
+BATCH_UPLOAD_ENDPOINTS = frozenset({'upload_batch', 'upload_batch_api'})
+
+
+class UploadRequest(Request):
+    """Request with a larger body limit on the batch upload routes"""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint in BATCH_UPLOAD_ENDPOINTS:
+            return current_app.config['BATCH_UPLOAD_MAX_CONTENT_LENGTH']
+        return super().max_content_length
+
+
+def _stream_length(stream):
+    """Size of a seekable upload stream, or None if it cannot seek"""
+    try:
+        stream.seek(0, 2)
+        length = stream.tell()
+        stream.seek(0)
+        return length
+    except (AttributeError, OSError):
+        return None
+
+
+def _csrf_ok():
+    """Check the CSRF token sent with a JSON/API request"""
+    if not current_app.config.get('WTF_CSRF_ENABLED', True):
+        return True
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken') or request.form.get('csrf_token'))
+        return True
+    except ValidationError:
+        return False
+
+
+def _direct_uploads_enabled():
+    """Direct uploads are on and the storage backend can issue write URLs"""
+    return current_app.config['DIRECT_UPLOADS'] and get_blob_service().supports_direct_upload
+
+
+def _upload_serializer():
+    """Signs direct-upload tickets so only the issuing user can commit them"""
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='direct-upload')
+
+
+def _upload_batch(files, caption, user_id):
+    """
+    Upload many files concurrently and save them in one transaction
+
+    Every file is validated before anything is uploaded. Files whose
+    content is already stored, or repeated within the batch, share the
+    existing blob instead of being transferred again. Blob transfers
+    run on a bounded thread pool, then all Image rows are inserted with
+    a single commit.
+
+    Args:
+        files: Uploaded FileStorage objects
+        caption: Caption applied to every image
+        user_id: Uploading user's ID
+
+    Returns:
+        tuple: (results, ok) where results has one dict per file and
+               ok is False if validation rejected the batch
+    """
+    max_files = current_app.config['BATCH_UPLOAD_MAX_FILES']
+    if len(files) > max_files:
+        return [{'filename': '', 'success': False, 'error': f'At most {max_files} files per batch'}], False
+
+    max_size = current_app.config['MAX_CONTENT_LENGTH']
+    errors = {}
+    for index, file in enumerate(files):
+        if not file.filename or not allowed_file(file.filename):
+            errors[index] = 'Invalid file type'
+        elif (_stream_length(file.stream) or 0) > max_size:
+            errors[index] = f'File is larger than {max_size // (1024 * 1024)} MB'
+    if errors:
+        return [{
+            'filename': file.filename,
+            'success': False,
+            'error': errors.get(index, 'Not uploaded, batch rejected')
+        } for index, file in enumerate(files)], False
+
+    blob_service = get_blob_service()
+    workers = current_app.config['BATCH_UPLOAD_WORKERS']
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(lambda file: content_hash(file.stream), files))
+    existing = Image.by_content_hash(hashes)
+
+    # one transfer per distinct new file, repeats in the batch reuse it
+    to_upload = {}
+    for file, digest in zip(files, hashes):
+        if digest is None or (digest not in existing and digest not in to_upload):
+            to_upload[digest if digest is not None else id(file)] = file
+
+    def upload_one(file):
+        return blob_service.upload_file(
+            file_stream=file.stream,
+            original_filename=file.filename,
+            content_type=file.content_type,
+            length=_stream_length(file.stream)
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        uploads = dict(zip(to_upload, pool.map(upload_one, to_upload.values())))
+
+    results = []
+    new_blobs = []
+    for file, digest in zip(files, hashes):
+        image = Image(caption=caption, user_id=user_id)
+        if digest in existing:
+            image.share_blob(existing[digest])
+        else:
+            upload = uploads[digest if digest is not None else id(file)]
+            if not upload['success']:
+                results.append({'filename': file.filename, 'success': False, 'error': upload.get('error', 'Unknown error')})
+                continue
+            image.blob_name = upload['blob_name']
+            image.content_hash = digest
+            image.thumbnail_status = Image.THUMBNAIL_PENDING
+            new_blobs.append(image.blob_name)
+            if digest is not None:
+                existing[digest] = image
+
+        db.session.add(image)
+        results.append({'filename': file.filename, 'success': True, 'blob_name': image.blob_name})
+
+    try:
+        thumbnail_queue.enqueue(new_blobs)
+        db.session.commit()
+    except Exception:
+        # nothing refers to the new blobs, remove them again
+        db.session.rollback()
+        blob_service.delete_many(new_blobs)
+        raise
+    thumbnail_queue.wake()
+    invalidate_gallery()
+    return results, True
+
+
+def _gallery_validators(fmt, cursor, state, scope='all'):
+    """
+    ETag and Last-Modified for a gallery response
+
+    Both change when the gallery version is bumped or the SAS URLs
+    rotate. The ETag also covers the viewer, since the page chrome
+    shows who is logged in.
+
+    Args:
+        fmt: 'html' or 'json'
+        cursor: Page cursor, or None for the first page
+        state: Current GalleryState
+        scope: Which listing, see _gallery_page
+
+    Returns:
+        tuple: (etag, last_modified)
+    """
+    blob_service = get_blob_service()
+    viewer = current_user.get_id() if current_user.is_authenticated else 'anon'
+    raw = f"{fmt}:{scope}:{state.version}:{sas_bucket(blob_service)}:{viewer}:{cursor or ''}"
+    etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    last_modified = max(state.updated_at.replace(tzinfo=timezone.utc), urls_issued_at(blob_service))
+    return etag, last_modified
+
+
+def _not_modified(etag, last_modified):
+    """
+    Build a 304 response if the client's copy is still current
+
+    Args:
+        etag: Current ETag
+        last_modified: Current Last-Modified
+
+    Returns:
+        Response or None
+    """
+    # pending flash messages would be lost on a 304
+    if '_flashes' in session:
+        return None
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = request.if_modified_since is not None and last_modified.replace(microsecond=0) <= request.if_modified_since
+    if not fresh:
+        return None
+
+    response = current_app.response_class(status=304)
+    return _set_validators(response, etag, last_modified)
+
+
+def _set_validators(response, etag, last_modified):
+    """Attach validators and revalidation headers to a gallery response"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def _gallery_page(cursor, fmt, state, scope='all', **filters):
+    """
+    Gallery page data, served from the page cache when possible
+
+    Args:
+        cursor: Page cursor, or None for the first page
+        fmt: 'html' for a rendered card fragment, 'json' for feed records
+        state: Current GalleryState, its version is part of the cache key
+        scope: Cache key part naming the listing, e.g. 'all', 'user:3'
+               or 'search:<hash>'; must identify the filters
+        **filters: user_id / search passed to fetch_page
+
+    Returns:
+        dict: html/images plus next_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    auth_state = 'user' if current_user.is_authenticated else 'anon'
+    key = f"gallery:{fmt}:{auth_state}:v{state.version}:{scope}:{cursor or ''}"
+
+    cache = get_page_cache()
+    if cache is not None:
+        page = cache.get(key)
+        if page is not None:
+            return page
+
+    items, next_cursor = fetch_page(
+        cursor=cursor,
+        page_size=current_app.config['GALLERY_PAGE_SIZE'],
+        **filters
+    )
+    blob_service = get_blob_service()
+    attach_urls(items, blob_service)
+
+    if fmt == 'html':
+        page = {
+            'html': render_template('_gallery_items.html', images=items,
+                                    thumbnail_sizes_attr=THUMBNAIL_SIZES_ATTR) if items else '',
+            'next_cursor': next_cursor
+        }
+    else:
+        page = {
+            'images': [item.to_dict() for item in items],
+            'next_cursor': next_cursor
+        }
+
+    if cache is not None:
+        cache.set(key, page, cache_ttl(blob_service))
+    return page
+
+
+def _gallery_html(scope='all', page_url=None, feed_url=None, **context):
+    """
+    Render a gallery-style listing page with conditional GET
+
+    Args:
+        scope: Listing scope, see _gallery_page
+        page_url: This page's URL without a cursor, for "Load more"
+        feed_url: JSON feed URL without a cursor, for infinite scroll
+        **context: filters for fetch_page (user_id, search) plus
+                   template values (page_title, empty_text, query)
+
+    Returns:
+        Response
+    """
+    filters = {name: context.pop(name) for name in ('user_id', 'search') if name in context}
+    cursor = request.args.get('cursor')
+    state = GalleryState.current()
+    etag, last_modified = _gallery_validators('html', cursor, state, scope)
+
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        page = _gallery_page(cursor, 'html', state, scope, **filters)
+    except ValueError:
+        abort(400)
+
+    response = current_app.make_response(render_template(
+        'gallery.html',
+        items_html=page['html'],
+        next_cursor=page['next_cursor'],
+        page_url=page_url or url_for('gallery'),
+        feed_url=feed_url or url_for('gallery_feed'),
+        thumbnail_sizes_attr=THUMBNAIL_SIZES_ATTR,
+        **context
+    ))
+    return _set_validators(response, etag, last_modified)
+
+
+def _gallery_json(scope='all', **filters):
+    """
+    JSON feed page of a gallery-style listing with conditional GET
+
+    Args:
+        scope: Listing scope, see _gallery_page
+        **filters: user_id / search passed to fetch_page
+
+    Returns:
+        Response
+    """
+    cursor = request.args.get('cursor')
+    state = GalleryState.current()
+    etag, last_modified = _gallery_validators('json', cursor, state, scope)
+
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        page = _gallery_page(cursor, 'json', state, scope, **filters)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    return _set_validators(jsonify(page), etag, last_modified)
+
+
+def _search_scope(terms):
+    """Page cache / ETag scope of a caption search"""
+    return 'search:' + hashlib.sha1(' '.join(terms).encode('utf-8')).hexdigest()[:16]
+
+
+def _user_id_or_404(username):
+    """ID of the user with this username"""
+    user_id = db.session.query(User.id).filter_by(username=username).scalar()
+    if user_id is None:
+        abort(404)
+    return user_id
+
 
 def register_routes(app):
     """Register all routes to the application"""
-    
+
+    # batch uploads may exceed MAX_CONTENT_LENGTH in total, see UploadRequest
+    app.request_class = UploadRequest
+
     @app.route('/')
     def index():
         """Home page"""
@@ -91,26 +457,40 @@ def register_routes(app):
                     flash('Invalid file type. Only PNG, JPG, GIF, WebP are allowed.', 'danger')
                     return redirect(url_for('upload'))
 
-                blob_service = BlobStorageService(
-                    connection_string=current_app.config['AZURE_STORAGE_CONNECTION_STRING'],
-                    container_original=current_app.config['AZURE_STORAGE_CONTAINER_ORIGINAL'],
-                    container_thumbnail=current_app.config['AZURE_STORAGE_CONTAINER_THUMBNAIL']
-                )
+                digest = content_hash(file.stream)
+                duplicate = Image.by_content_hash([digest]).get(digest)
+                new_image = Image(caption=form.caption.data or '', user_id=current_user.id)
 
-                result = blob_service.upload_file(
-                    file_stream=file.stream,
-                    original_filename=file.filename,
-                    content_type=file.content_type
-                )
+                if duplicate is not None:
+                    # same bytes already stored, skip the transfer and thumbnailing
+                    new_image.share_blob(duplicate)
+                    result = {'success': True}
+                else:
+                    blob_service = get_blob_service()
 
-                if result['success']:
-                    new_image = Image(
-                        caption=form.caption.data or '',
-                        blob_name=result['blob_name'],
-                        user_id=current_user.id
+                    result = blob_service.upload_file(
+                        file_stream=file.stream,
+                        original_filename=file.filename,
+                        content_type=file.content_type,
+                        length=_stream_length(file.stream)
                     )
+                    new_image.blob_name = result.get('blob_name')
+                    new_image.content_hash = digest
+
+                if result['success']:
                     db.session.add(new_image)
-                    db.session.commit()
+                    try:
+                        if duplicate is None:
+                            thumbnail_queue.enqueue([result['blob_name']])
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        if duplicate is None:
+                            # nothing refers to the new blob, remove it again
+                            blob_service.delete_file(result['blob_name'])
+                        raise
+                    thumbnail_queue.wake()
+                    invalidate_gallery()
 
                     flash('Image uploaded successfully! Thumbnail will be generated shortly.', 'success')
                     return redirect(url_for('gallery'))
@@ -121,28 +501,324 @@ def register_routes(app):
                 flash(f'An error occurred: {str(e)}', 'danger')
                 current_app.logger.error(f'Upload error: {str(e)}')
 
-        return render_template('upload.html', form=form)
+        return render_template('upload.html', form=form,
+                               direct_uploads=_direct_uploads_enabled())
+
+    @app.route('/upload/batch', methods=['GET', 'POST'])
+    @login_required
+    def upload_batch():
+        """Multi-image upload page"""
+        form = BatchUploadForm()
+
+        if form.validate_on_submit():
+            try:
+                results, ok = _upload_batch(form.images.data, form.caption.data or '', current_user.id)
+
+                uploaded = sum(1 for result in results if result['success'])
+                for result in results:
+                    if not result['success']:
+                        flash(f'{result["filename"]}: {result["error"]}', 'danger')
+
+                if ok and uploaded:
+                    flash(f'{uploaded} of {len(results)} images uploaded! Thumbnails will be generated shortly.', 'success')
+                    return redirect(url_for('gallery'))
+
+            except Exception as e:
+                db.session.rollback()
+                flash(f'An error occurred: {str(e)}', 'danger')
+                current_app.logger.error(f'Batch upload error: {str(e)}')
+
+        return render_template('upload_batch.html', form=form)
+
+    @app.route('/api/upload/batch', methods=['POST'])
+    @login_required
+    def upload_batch_api():
+        """Multi-image upload returning per-file results"""
+        if not _csrf_ok():
+            return jsonify({'error': 'Invalid CSRF token'}), 400
+
+        files = request.files.getlist('images')
+        if not files:
+            return jsonify({'error': 'No files uploaded'}), 400
+
+        caption = (request.form.get('caption') or '').strip()
+        if len(caption) > 200:
+            return jsonify({'error': 'Caption must be less than 200 characters'}), 400
+
+        results, ok = _upload_batch(files, caption, current_user.id)
+        return jsonify({'results': results}), 200 if ok else 400
+
+    @app.route('/api/uploads', methods=['POST'])
+    @login_required
+    def create_direct_upload():
+        """Issue a short-lived write URL for a browser-to-storage upload"""
+        if not _direct_uploads_enabled():
+            abort(404)
+        if not _csrf_ok():
+            return jsonify({'error': 'Invalid CSRF token'}), 400
+
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        size = data.get('size')
+
+        if not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type. Only PNG, JPG, GIF, WebP are allowed.'}), 400
+        if not isinstance(size, int) or size <= 0 or size > current_app.config['MAX_CONTENT_LENGTH']:
+            return jsonify({'error': 'File is empty or too large'}), 400
+
+        target = get_blob_service().generate_upload_url(
+            filename,
+            expiry_minutes=current_app.config['DIRECT_UPLOAD_SAS_MINUTES']
+        )
+        ticket = _upload_serializer().dumps({'blob_name': target['blob_name'], 'user_id': current_user.id})
+
+        return jsonify({
+            'upload_url': target['upload_url'],
+            'ticket': ticket
+        })
+
+    @app.route('/api/uploads/commit', methods=['POST'])
+    @login_required
+    def commit_direct_upload():
+        """Create the Image row once the browser has finished uploading"""
+        if not _direct_uploads_enabled():
+            abort(404)
+        if not _csrf_ok():
+            return jsonify({'error': 'Invalid CSRF token'}), 400
+
+        data = request.get_json(silent=True) or {}
+        caption = (data.get('caption') or '').strip()
+        if len(caption) > 200:
+            return jsonify({'error': 'Caption must be less than 200 characters'}), 400
+
+        try:
+            ticket = _upload_serializer().loads(
+                data.get('ticket') or '',
+                max_age=current_app.config['DIRECT_UPLOAD_SAS_MINUTES'] * 60 * 2
+            )
+        except BadSignature:
+            return jsonify({'error': 'Invalid or expired upload ticket'}), 400
+        if ticket['user_id'] != current_user.id:
+            abort(403)
+
+        blob_service = get_blob_service()
+        properties = blob_service.get_blob_properties(ticket['blob_name'])
+        if properties is None:
+            return jsonify({'error': 'Upload not found'}), 400
+        content_type = (properties['content_type'] or '').split(';')[0].strip().lower()
+        if properties['size'] > current_app.config['MAX_CONTENT_LENGTH']:
+            error = 'File is too large'
+        elif content_type not in ALLOWED_CONTENT_TYPES:
+            error = 'Only PNG, JPEG, GIF and WebP images are allowed'
+        else:
+            error = None
+        if error:
+            # never committed, nothing else can refer to it
+            blob_service.delete_file(ticket['blob_name'])
+            return jsonify({'error': error}), 400
+
+        if Image.query.filter_by(blob_name=ticket['blob_name']).first() is None:
+            new_image = Image(
+                caption=caption,
+                blob_name=ticket['blob_name'],
+                user_id=current_user.id
+            )
+            db.session.add(new_image)
+            thumbnail_queue.enqueue([new_image.blob_name])
+            db.session.commit()
+            thumbnail_queue.wake()
+            invalidate_gallery()
+
+        return jsonify({'redirect': url_for('gallery')})
+
+    @app.route('/api/images/<int:image_id>', methods=['DELETE'])
+    @login_required
+    def delete_image(image_id):
+        """Delete one of the current user's images, with its blobs if nothing else uses them"""
+        if not _csrf_ok():
+            return jsonify({'error': 'Invalid CSRF token'}), 400
+
+        image = db.session.get(Image, image_id)
+        if image is None:
+            abort(404)
+        if image.user_id != current_user.id:
+            abort(403)
+
+        blob_name = image.blob_name
+        sizes = [int(size) for size in image.thumbnail_sizes.split(',')] if image.thumbnail_sizes else []
+        db.session.delete(image)
+        db.session.commit()
+        invalidate_gallery()
+
+        # reposts share the blob, keep it while any row still points at it
+        deleted = 0
+        if Image.query.filter_by(blob_name=blob_name).first() is None:
+            ThumbnailJob.query.filter_by(blob_name=blob_name).delete(synchronize_session=False)
+            db.session.commit()
+            sizes = set(sizes) | set(configured_sizes(current_app.config))
+            deleted = delete_image_blobs(get_blob_service(), blob_name, sizes)
+
+        return jsonify({'deleted': image_id, 'blobs_deleted': deleted})
+
+    @app.route('/media/<container>/<path:blob_name>')
+    def media(container, blob_name):
+        """Serve a blob from local storage"""
+        storage = get_blob_service()
+        if not isinstance(storage, LocalStorageService):
+            abort(404)
+        try:
+            path = storage.path_for(container, blob_name)
+        except ValueError:
+            abort(404)
+        if not os.path.isfile(path):
+            abort(404)
+
+        accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT')
+        if accel_prefix:
+            # nginx streams the file itself, with ranges and ETags
+            response = current_app.response_class(
+                mimetype=mimetypes.guess_type(blob_name)[0] or 'application/octet-stream'
+            )
+            response.headers['X-Accel-Redirect'] = (
+                f"{accel_prefix.rstrip('/')}/{quote(storage.relative_path(container, blob_name))}"
+            )
+        else:
+            # Range, If-None-Match and If-Modified-Since are handled here; the body
+            # goes out via X-Sendfile (USE_X_SENDFILE) or the server's file wrapper
+            response = send_file(path, conditional=True, etag=True,
+                                 max_age=current_app.config['MEDIA_MAX_AGE'])
+
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['MEDIA_MAX_AGE']
+        response.cache_control.immutable = True
+        return response
 
     @app.route('/gallery')
+    @read_only
     def gallery():
         """Public gallery page"""
-        images = Image.query.order_by(Image.upload_date.desc()).all()
+        return _gallery_html(page_title='Gallery')
 
-        blob_service = BlobStorageService(
-            connection_string=current_app.config['AZURE_STORAGE_CONNECTION_STRING'],
-            container_original=current_app.config['AZURE_STORAGE_CONTAINER_ORIGINAL'],
-            container_thumbnail=current_app.config['AZURE_STORAGE_CONTAINER_THUMBNAIL']
+    @app.route('/api/gallery')
+    @read_only
+    def gallery_feed():
+        """JSON gallery page for infinite scroll"""
+        return _gallery_json()
+
+    @app.route('/search')
+    @read_only
+    def search():
+        """Images whose caption matches the query"""
+        query = request.args.get('q', '').strip()
+        terms = search_terms(query)
+        if not terms:
+            return render_template('gallery.html', items_html='', next_cursor=None, page_title='Search',
+                                   page_url=url_for('search'), feed_url=url_for('search_feed'),
+                                   query=query, empty_text='Type a word from a caption to search',
+                                   thumbnail_sizes_attr=THUMBNAIL_SIZES_ATTR)
+
+        return _gallery_html(
+            _search_scope(terms),
+            page_url=url_for('search', q=query),
+            feed_url=url_for('search_feed', q=query),
+            search=terms,
+            page_title=f'Search: {query}',
+            query=query,
+            empty_text='No photos match your search'
         )
 
-        # Generate fresh URLs with new SAS tokens for each image
-        for image in images:
-            # Get thumbnail URL (returns None if not exists)
-            thumbnail_url = blob_service.get_thumbnail_url(image.blob_name)
-            # Generate original URL
-            original_url = blob_service.generate_download_url(image.blob_name)
+    @app.route('/api/search')
+    @read_only
+    def search_feed():
+        """JSON caption search page for infinite scroll"""
+        terms = search_terms(request.args.get('q'))
+        if not terms:
+            return jsonify({'images': [], 'next_cursor': None})
+        return _gallery_json(_search_scope(terms), search=terms)
 
-            # Set temporary attributes for template rendering
-            image.thumbnail_url = thumbnail_url or original_url
-            image.original_url = original_url
+    @app.route('/users/<username>')
+    @read_only
+    def user_gallery(username):
+        """One user's photos"""
+        user_id = _user_id_or_404(username)
+        return _gallery_html(
+            f'user:{user_id}',
+            page_url=url_for('user_gallery', username=username),
+            feed_url=url_for('user_gallery_feed', username=username),
+            user_id=user_id,
+            page_title=f"{username}'s photos",
+            empty_text=f'{username} has not shared any photos yet'
+        )
+
+    @app.route('/api/users/<username>/images')
+    @read_only
+    def user_gallery_feed(username):
+        """JSON page of one user's photos for infinite scroll"""
+        user_id = _user_id_or_404(username)
+        return _gallery_json(f'user:{user_id}', user_id=user_id)
+
+    @app.route('/api/thumbnails/callback', methods=['POST'])
+    def thumbnail_callback():
+        """Thumbnail function reports the result for one original blob"""
+        token = current_app.config.get('THUMBNAIL_CALLBACK_TOKEN')
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('X-Callback-Token', ''), token):
+            abort(403)
+
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+        blob_name = data.get('blob_name')
+        status = data.get('status')
+        if not isinstance(blob_name, str) or not blob_name or status not in Image.THUMBNAIL_STATUSES:
+            return jsonify({'error': 'blob_name and a valid status are required'}), 400
+
+        width = data.get('width')
+        height = data.get('height')
+        sizes = data.get('sizes')
+        widths = data.get('widths')
+        if (width is not None and not _positive_int(width)) or (height is not None and not _positive_int(height)):
+            return jsonify({'error': 'width and height must be positive integers'}), 400
+        if sizes is not None and (not isinstance(sizes, list) or not all(_positive_int(size) for size in sizes)):
+            return jsonify({'error': 'sizes must be a list of positive integers'}), 400
+        if widths is not None and (not isinstance(widths, list) or not sizes or len(widths) != len(sizes)
+                                   or not all(_positive_int(w) for w in widths)):
+            return jsonify({'error': 'widths must be a positive integer per size'}), 400
+        if widths:
+            # widths follow the order of sizes
+            widths = ','.join(str(w) for _, w in sorted(dict(zip(sizes, widths)).items()))
+        sizes = ','.join(str(size) for size in sorted(set(sizes))) if sizes else None
+        if sizes and (len(sizes) > Image.thumbnail_sizes.type.length
+                      or len(widths or '') > Image.thumbnail_widths.type.length):
+            return jsonify({'error': 'Too many sizes'}), 400
+
+        images = Image.query.filter_by(blob_name=blob_name).all()
+        if not images:
+            # upload row may not be committed yet, the function retries
+            return jsonify({'error': 'Unknown blob'}), 404
+
+        placeholder = data.get('placeholder')
+        if (not isinstance(placeholder, str) or not placeholder.startswith('data:image/')
+                or len(placeholder) > MAX_PLACEHOLDER_LENGTH):
+            placeholder = None
+        ratio = data.get('aspect_ratio')
+        if not isinstance(ratio, (int, float)) or isinstance(ratio, bool) or not math.isfinite(ratio) or ratio <= 0:
+            ratio = None
+
+        for image in images:
+            image.thumbnail_status = status
+            image.thumbnail_width = width
+            image.thumbnail_height = height
+            if sizes:
+                image.thumbnail_sizes = sizes
+                image.thumbnail_widths = widths
+            if placeholder:
+                image.placeholder = placeholder
+            if ratio:
+                image.aspect_ratio = ratio
+        db.session.commit()
+        invalidate_gallery()
 
-        return render_template('gallery.html', images=images)
+        return jsonify({'updated': len(images)})
@@ -0,0 +1,94 @@
+"""Time-bucketed, cached SAS URL signing"""
+
+import time
+from datetime import datetime, timezone
+from app.cache import LRUCache
+
+
+class SasUrlSigner:
+    """
+    Hands out stable read SAS URLs
+
+    Every URL issued inside one bucket window shares the same expiry, so
+    the same blob gets the same URL until the window rolls over and
+    browser/CDN caches can reuse the image. A new URL is issued at each
+    rollover, while the old one still has validity_seconds left.
+    """
+
+    def __init__(self, account_url, account_name, account_key,
+                 bucket_seconds=3600, validity_seconds=86400, maxsize=10000):
+        """
+        Init signer
+
+        Args:
+            account_url: Blob endpoint, e.g. https://<account>.blob.core.windows.net
+            account_name: Storage account name
+            account_key: Storage account key
+            bucket_seconds: Window during which a blob keeps the same URL
+            validity_seconds: Minimum lifetime left on a URL when it is replaced
+            maxsize: Max cached URLs
+        """
+        self.account_url = account_url.rstrip('/')
+        self.account_name = account_name
+        self.account_key = account_key
+        self.bucket_seconds = bucket_seconds
+        self.validity_seconds = validity_seconds
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def current_bucket(self):
+        """Index of the current bucket window"""
+        return int(time.time() // self.bucket_seconds)
+
+    def seconds_until_rotation(self):
+        """Seconds until the current bucket ends and URLs change"""
+        return (self.current_bucket() + 1) * self.bucket_seconds - time.time()
+
+    def _sign(self, container_name, blob_name, bucket):
+        from azure.storage.blob import generate_blob_sas, BlobSasPermissions
+
+        # expiry depends only on the bucket, so the token is deterministic
+        expiry_ts = (bucket + 1) * self.bucket_seconds + self.validity_seconds
+        sas_token = generate_blob_sas(
+            account_name=self.account_name,
+            container_name=container_name,
+            blob_name=blob_name,
+            account_key=self.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.fromtimestamp(expiry_ts, tz=timezone.utc)
+        )
+        return f"{self.account_url}/{container_name}/{blob_name}?{sas_token}"
+
+    def sign(self, container_name, blob_name):
+        """
+        Get the read URL for one blob
+
+        Args:
+            container_name: Container name
+            blob_name: Blob filename
+
+        Returns:
+            Full URL with SAS token
+        """
+        bucket = self.current_bucket()
+        key = (container_name, blob_name)
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == bucket:
+            return cached[1]
+
+        url = self._sign(container_name, blob_name, bucket)
+        self._cache.set(key, (bucket, url))
+        return url
+
+    def sign_many(self, container_name, blob_names):
+        """
+        Get read URLs for many blobs in one container
+
+        Args:
+            container_name: Container name
+            blob_names: Iterable of blob filenames
+
+        Returns:
+            dict: blob_name -> URL
+        """
+        return {name: self.sign(container_name, name) for name in blob_names}
@@ -0,0 +1,97 @@
+"""Caption full-text search
+
+PostgreSQL matches against the GIN-indexed to_tsvector expression
+declared on Image. SQLite keeps an external-content FTS5 table in sync
+with triggers. Other databases fall back to LIKE.
+"""
+
+import re
+from sqlalchemy import event, text
+from app.models import db, Image, CAPTION_SEARCH_CONFIG
+
+# only plain words of a query are used, so user input never reaches the
+# tsquery / FTS5 parsers as syntax, and at most this many of them
+MAX_SEARCH_TERMS = 8
+
+SQLITE_FTS_TABLE = 'images_fts'
+
+SQLITE_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} "
+    "USING fts5(caption, content='images', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, caption) VALUES (new.id, new.caption); END",
+    f"CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, caption) VALUES ('delete', old.id, old.caption); END",
+    f"CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE OF caption ON images BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, caption) VALUES ('delete', old.id, old.caption); "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, caption) VALUES (new.id, new.caption); END",
+)
+
+
+def search_terms(query):
+    """
+    Normalised words of a search query
+
+    Args:
+        query: Raw query string
+
+    Returns:
+        list: Lower-case words, at most MAX_SEARCH_TERMS
+    """
+    return re.findall(r'[^\W_]+', (query or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def caption_filter(terms, dialect_name):
+    """
+    SQL condition matching captions that contain every term as a prefix
+
+    Args:
+        terms: Words from search_terms, must not be empty
+        dialect_name: Database dialect, e.g. 'postgresql' or 'sqlite'
+
+    Returns:
+        SQLAlchemy boolean expression
+    """
+    if dialect_name == 'postgresql':
+        document = db.func.to_tsvector(CAPTION_SEARCH_CONFIG, db.func.coalesce(Image.caption, db.literal_column("''")))
+        tsquery = db.func.to_tsquery(CAPTION_SEARCH_CONFIG, ' & '.join(f'{term}:*' for term in terms))
+        return document.op('@@')(tsquery)
+
+    if dialect_name == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return Image.id.in_(
+            text(f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH :match")
+            .bindparams(match=match)
+            .columns(db.column('rowid'))
+        )
+
+    return db.and_(*(Image.caption.ilike(f'%{term}%') for term in terms))
+
+
+def ensure_search_index(connection):
+    """
+    Create the SQLite FTS5 table and triggers if missing
+
+    Also fills the table from existing rows the first time, so it can
+    be run against a database created before search existed. PostgreSQL
+    needs nothing here beyond the index on Image.
+
+    Args:
+        connection: SQLAlchemy connection
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': SQLITE_FTS_TABLE}).first() is not None
+
+    for statement in SQLITE_FTS_DDL:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"))
+
+
+@event.listens_for(Image.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    ensure_search_index(connection)
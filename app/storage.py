@@ -0,0 +1,144 @@
+"""Storage backend interface shared by the Azure, local-disk and in-memory services"""
+
+import os
+import uuid
+from abc import ABC, abstractmethod
+
+
+class BlobNotFoundError(LookupError):
+    """The requested blob does not exist"""
+
+
+class StorageService(ABC):
+    """
+    Surface the app uses to store and link image blobs
+
+    Blobs live in two containers, originals and thumbnails, and are
+    addressed by name. Rendition names may contain a "/" (e.g.
+    "400/<uuid>.webp").
+    """
+
+    # whether generate_upload_url can hand browsers a direct write URL
+    supports_direct_upload = False
+
+    container_original = 'originals'
+    container_thumbnail = 'thumbnails'
+
+    def _generate_unique_filename(self, original_filename):
+        """
+        Generate unique filename
+
+        Args:
+            original_filename: Original filename
+
+        Returns:
+            Unique filename (UUID + extension)
+        """
+        ext = os.path.splitext(original_filename)[1].lower()
+        return f"{uuid.uuid4()}{ext}"
+
+    @abstractmethod
+    def ensure_containers(self):
+        """Create the original and thumbnail containers if missing"""
+
+    @abstractmethod
+    def upload_file(self, file_stream, original_filename, content_type='image/jpeg', length=None):
+        """
+        Store an uploaded original under a new unique name
+
+        Returns:
+            dict: success, blob_name and url, or success False and error
+        """
+
+    def generate_upload_url(self, original_filename, expiry_minutes=15):
+        """
+        Short-lived URL a browser can PUT an original to
+
+        Returns:
+            dict: blob_name and upload_url
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support direct uploads")
+
+    @abstractmethod
+    def get_blob_properties(self, blob_name, container_name=None):
+        """
+        Size and content type of a stored blob
+
+        Returns:
+            dict: size and content_type, or None if the blob does not exist
+        """
+
+    @abstractmethod
+    def generate_download_url(self, blob_name, container_name=None, expiry_hours=None):
+        """URL a browser can read the blob from"""
+
+    @abstractmethod
+    def sign_many(self, blob_names, container_name=None):
+        """
+        Read URLs for many blobs of one container
+
+        Returns:
+            dict: blob_name -> URL
+        """
+
+    @abstractmethod
+    def download_file(self, blob_name, container_name=None):
+        """
+        Blob content as bytes
+
+        Raises:
+            BlobNotFoundError: If the blob does not exist
+        """
+
+    @abstractmethod
+    def upload_bytes(self, data, blob_name, container_name=None, content_type='application/octet-stream',
+                     cache_control=None):
+        """Write a blob under a given name, thumbnails container by default"""
+
+    @abstractmethod
+    def delete_file(self, blob_name, container_name=None):
+        """
+        Delete one blob
+
+        Returns:
+            bool: Whether a blob was deleted
+        """
+
+    @abstractmethod
+    def list_blobs(self, container_name=None, page_size=5000):
+        """
+        Walk a container page by page
+
+        Args:
+            container_name: Container name (default: originals)
+            page_size: Max blobs per page
+
+        Yields:
+            list: (blob_name, last_modified) tuples, last_modified in UTC
+        """
+
+    def delete_many(self, blob_names, container_name=None):
+        """
+        Delete many blobs of one container
+
+        Backends with a batch API override this; the default deletes
+        one blob at a time.
+
+        Args:
+            blob_names: Blob names
+            container_name: Container name (default: originals)
+
+        Returns:
+            int: Blobs deleted
+        """
+        return sum(1 for blob_name in blob_names if self.delete_file(blob_name, container_name))
+
+    def thumbnail_url_for(self, original_blob_name):
+        """Thumbnail URL without checking the blob exists"""
+        return self.generate_download_url(original_blob_name, self.container_thumbnail)
+
+    def get_thumbnail_url(self, original_blob_name):
+        """Thumbnail URL if the thumbnail exists, else None"""
+        if self.get_blob_properties(original_blob_name, self.container_thumbnail) is None:
+            return None
+        return self.thumbnail_url_for(original_blob_name)
@@ -0,0 +1,314 @@
+"""In-app thumbnail pipeline: a database-backed job queue and a render worker
+
+Uploads add a ThumbnailJob row in the same transaction as the Image
+row. A ThumbnailWorker claims jobs, renders them in a process pool
+with the backfill code, and writes the result back, so resizing never
+runs on a request thread. Any number of workers may poll the same
+table; claims are conditional updates, so each job runs once.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, or_
+from app.metrics import record, register_collector
+from app.models import db, Image, ThumbnailJob
+
+# uploads turned away because the queue was full, per process
+_rejected = 0
+_rejected_lock = threading.Lock()
+_collector_registered = False
+
+
+def init_thumbnail_queue(app):
+    """
+    Wire queue metrics and, if configured, the in-app worker
+
+    The worker is started by the first request rather than here, so
+    building the app stays free of I/O and forks no processes.
+
+    Args:
+        app: Flask app
+    """
+    global _collector_registered
+    if not app.config['THUMBNAIL_QUEUE']:
+        return
+
+    if not _collector_registered:
+        register_collector(_queue_metrics)
+        _collector_registered = True
+
+    if not app.config['THUMBNAIL_WORKER_IN_APP']:
+        return
+
+    app.extensions['thumbnail_worker'] = ThumbnailWorker(app)
+
+    @app.before_request
+    def start_thumbnail_worker():
+        app.extensions['thumbnail_worker'].start()
+
+
+def enqueue(blob_names):
+    """
+    Add render jobs to the current transaction
+
+    Nothing is queued when the pipeline is off. When the queue already
+    holds THUMBNAIL_QUEUE_MAX jobs, the extra blobs are left pending for
+    `flask thumbnails backfill` instead of growing the backlog.
+
+    Args:
+        blob_names: Original blob names
+
+    Returns:
+        int: Jobs added
+    """
+    global _rejected
+    config = current_app.config
+    if not config['THUMBNAIL_QUEUE'] or not blob_names:
+        return 0
+
+    room = max(0, config['THUMBNAIL_QUEUE_MAX'] - queue_depth())
+    accepted = list(blob_names)[:room]
+    if len(accepted) < len(blob_names):
+        with _rejected_lock:
+            _rejected += len(blob_names) - len(accepted)
+        current_app.logger.warning(f'Thumbnail queue full, {len(blob_names) - len(accepted)} uploads left pending')
+
+    db.session.add_all(ThumbnailJob(blob_name=blob_name) for blob_name in accepted)
+    return len(accepted)
+
+
+def wake():
+    """Tell this process's worker, if any, that jobs were just committed"""
+    worker = current_app.extensions.get('thumbnail_worker')
+    if worker is not None:
+        worker.wake()
+
+
+def queue_depth():
+    """Jobs queued or running"""
+    return ThumbnailJob.query.filter(
+        ThumbnailJob.status.in_((ThumbnailJob.QUEUED, ThumbnailJob.RUNNING))
+    ).count()
+
+
+def _queue_metrics():
+    counts = dict(db.session.query(ThumbnailJob.status, func.count()).group_by(ThumbnailJob.status).all())
+    lines = [
+        '# HELP thumbnail_queue_depth Thumbnail jobs by state',
+        '# TYPE thumbnail_queue_depth gauge',
+    ]
+    for status in (ThumbnailJob.QUEUED, ThumbnailJob.RUNNING, ThumbnailJob.FAILED):
+        lines.append(f'thumbnail_queue_depth{{status="{status}"}} {counts.get(status, 0)}')
+    lines.extend([
+        '# HELP thumbnail_queue_rejected_total Uploads not queued because the queue was full',
+        '# TYPE thumbnail_queue_rejected_total counter',
+        f'thumbnail_queue_rejected_total {_rejected}',
+    ])
+    return lines
+
+
+def claim(limit, lease_seconds):
+    """
+    Claim up to limit runnable jobs
+
+    Runnable means queued and due, or running with an expired lease
+    (its worker died). Each claim is a conditional UPDATE, so when two
+    workers race for a job only one of them gets it.
+
+    Args:
+        limit: Max jobs to claim
+        lease_seconds: How long a claim is held before it may be retaken
+
+    Returns:
+        list: (id, blob_name, attempts) of the claimed jobs
+    """
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(ThumbnailJob.status == ThumbnailJob.QUEUED, ThumbnailJob.run_after <= now),
+        and_(ThumbnailJob.status == ThumbnailJob.RUNNING,
+             ThumbnailJob.claimed_at < now - timedelta(seconds=lease_seconds)),
+    )
+
+    candidates = db.session.query(ThumbnailJob.id, ThumbnailJob.blob_name, ThumbnailJob.attempts).filter(
+        runnable
+    ).order_by(ThumbnailJob.run_after, ThumbnailJob.id).limit(limit).with_for_update(skip_locked=True).all()
+
+    claimed = []
+    for job_id, blob_name, attempts in candidates:
+        updated = ThumbnailJob.query.filter(ThumbnailJob.id == job_id, runnable).update({
+            ThumbnailJob.status: ThumbnailJob.RUNNING,
+            ThumbnailJob.claimed_at: now,
+            ThumbnailJob.attempts: ThumbnailJob.attempts + 1,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append((job_id, blob_name, attempts + 1))
+    db.session.commit()
+    return claimed
+
+
+def finish(job_id, attempts, result):
+    """
+    Record a render result
+
+    Rendered and permanently failed images are written to every Image
+    row for the blob and the job is removed. Transient errors are
+    retried with exponential backoff until THUMBNAIL_JOB_ATTEMPTS is
+    reached, then the image is marked failed and the job kept as a
+    failed record.
+
+    Args:
+        job_id: Job ID
+        attempts: Attempts made so far, including this one
+        result: dict from render_blob, status None for transient errors
+    """
+    from app.page_cache import invalidate_gallery
+    from app.thumbnails import apply_result
+
+    config = current_app.config
+    job = ThumbnailJob.query.filter_by(id=job_id)
+
+    if result['status'] is not None:
+        apply_result(result)
+        job.delete(synchronize_session=False)
+    elif attempts >= config['THUMBNAIL_JOB_ATTEMPTS']:
+        apply_result({'blob_name': result['blob_name'], 'status': Image.THUMBNAIL_FAILED})
+        job.update({
+            ThumbnailJob.status: ThumbnailJob.FAILED,
+            ThumbnailJob.last_error: result.get('error'),
+        }, synchronize_session=False)
+    else:
+        delay = config['THUMBNAIL_JOB_RETRY_SECONDS'] * 2 ** (attempts - 1)
+        job.update({
+            ThumbnailJob.status: ThumbnailJob.QUEUED,
+            ThumbnailJob.run_after: datetime.utcnow() + timedelta(seconds=delay),
+            ThumbnailJob.last_error: result.get('error'),
+        }, synchronize_session=False)
+        db.session.commit()
+        return
+
+    db.session.commit()
+    invalidate_gallery()
+
+
+class ThumbnailWorker:
+    """Claims queued jobs and renders them in a process pool"""
+
+    def __init__(self, app, workers=None, in_flight=None, poll_interval=None):
+        """
+        Init worker
+
+        Args:
+            app: Flask app
+            workers: Render processes, default THUMBNAIL_WORKERS
+            in_flight: Max jobs claimed at once, default 2 x workers
+            poll_interval: Seconds between queue polls when idle
+        """
+        self.app = app
+        self.workers = workers or app.config['THUMBNAIL_WORKERS']
+        self.in_flight = in_flight or self.workers * 2
+        self.poll_interval = poll_interval or app.config['THUMBNAIL_QUEUE_POLL_SECONDS']
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Run the dispatcher in a background thread, once"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='thumbnail-worker', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Poll the queue now instead of at the next interval"""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """Stop after the jobs in flight finish"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _new_pool(self):
+        from app.thumbnails import _init_worker, storage_config
+        # spawn, since the web worker that owns us is multi-threaded
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(storage_config(self.app.config),)
+        )
+
+    def _handle(self, future, pending):
+        """Record the result of a finished future, True if its pool broke"""
+        job_id, attempts, blob_name, started = pending.pop(future)
+        broken = False
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # a render process died (e.g. OOM)
+            result = {'blob_name': blob_name, 'status': None, 'error': str(e)}
+            broken = True
+        finish(job_id, attempts, result)
+        record('thumbnail_job_duration_seconds', time.perf_counter() - started,
+               (('status', result['status'] or 'retry'),))
+        return broken
+
+    def run(self):
+        """Dispatch jobs until stop() is called"""
+        from app.thumbnails import _render_in_worker, configured_sizes
+
+        with self.app.app_context():
+            config = self.app.config
+            sizes = configured_sizes(config)
+            max_pixels = config['THUMBNAIL_MAX_PIXELS']
+            lease = config['THUMBNAIL_JOB_LEASE_SECONDS']
+            pool = self._new_pool()
+            pending = {}  # future -> (job id, attempts, blob name, started)
+
+            try:
+                while not self._stop.is_set():
+                    try:
+                        free = self.in_flight - len(pending)
+                        if free > 0:
+                            for job_id, blob_name, attempts in claim(free, lease):
+                                future = pool.submit(_render_in_worker, blob_name, sizes, max_pixels)
+                                pending[future] = (job_id, attempts, blob_name, time.perf_counter())
+
+                        if not pending:
+                            self._wake.wait(self.poll_interval)
+                            self._wake.clear()
+                            continue
+
+                        done, _ = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                        broken = False
+                        for future in done:
+                            broken = self._handle(future, pending) or broken
+
+                        if broken:
+                            # every other job of the broken pool fails too, then start fresh
+                            for future in wait(pending).done:
+                                self._handle(future, pending)
+                            pool.shutdown(cancel_futures=True)
+                            pool = self._new_pool()
+
+                    except Exception as e:
+                        db.session.rollback()
+                        self.app.logger.error(f'Thumbnail worker error: {e}')
+                        self._stop.wait(self.poll_interval)
+                    finally:
+                        db.session.remove()
+
+                # let claimed jobs finish so they are not left running until the lease expires
+                for future in wait(pending).done:
+                    self._handle(future, pending)
+            finally:
+                pool.shutdown(cancel_futures=True)
@@ -0,0 +1,361 @@
+"""Thumbnail rendering inside the web app process tree
+
+Reuses functions/thumbnail_generator/renditions.py so backfills produce
+exactly what the blob trigger does. Pillow is only imported when a
+rendition is actually rendered.
+"""
+
+import importlib.util
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+from sqlalchemy import and_, or_
+from app.blob_service import build_storage_service, STORAGE_CONFIG_KEYS
+from app.models import db, Image
+from app.storage import BlobNotFoundError
+
+RENDITIONS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'functions', 'thumbnail_generator', 'renditions.py'
+)
+
+_renditions = None
+_renditions_lock = threading.Lock()
+
+
+def load_renditions():
+    """Import the function's renditions module by path, once"""
+    global _renditions
+    if _renditions is None:
+        with _renditions_lock:
+            if _renditions is None:
+                spec = importlib.util.spec_from_file_location('renditions', RENDITIONS_PATH)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _renditions = module
+    return _renditions
+
+
+def render_blob(storage, blob_name, sizes, max_pixels):
+    """
+    Download one original, render its renditions and upload them
+
+    Args:
+        storage: Storage service
+        blob_name: Original blob name
+        sizes: Rendition sizes
+        max_pixels: Decoded-pixel budget
+
+    Returns:
+        dict: blob_name, status ('ready' or 'failed') and, when ready,
+              width, height, sizes, widths, placeholder and aspect_ratio as
+              stored on Image
+    """
+    renditions = load_renditions()
+
+    try:
+        data = storage.download_file(blob_name)
+    except BlobNotFoundError as e:
+        # original is gone (deleted, or a commit that never uploaded), retrying will not help
+        return {'blob_name': blob_name, 'status': Image.THUMBNAIL_FAILED, 'error': f'Original not found: {e}'}
+    try:
+        img = renditions.open_image(BytesIO(data), max(sizes), max_pixels)
+    except (renditions.ImageTooLargeError, OSError) as e:
+        # oversized, decompression bomb or undecodable, retrying will not help
+        return {'blob_name': blob_name, 'status': Image.THUMBNAIL_FAILED, 'error': str(e)}
+    del data
+
+    rendered = renditions.render_renditions(img, blob_name, sizes)
+    ratio = renditions.aspect_ratio(img)
+    img.close()
+
+    for rendition in rendered:
+        storage.upload_bytes(
+            rendition['data'],
+            rendition['name'],
+            content_type=rendition['content_type'],
+            cache_control=renditions.CACHE_CONTROL
+        )
+
+    smallest = min(rendered, key=lambda r: r['size'])
+    return {
+        'blob_name': blob_name,
+        'status': Image.THUMBNAIL_READY,
+        'width': smallest['width'],
+        'height': smallest['height'],
+        'sizes': sizes_string(sizes),
+        'widths': ','.join(str(width) for width in renditions.rendition_widths(rendered)),
+        'placeholder': renditions.render_placeholder(smallest['data']),
+        'aspect_ratio': ratio
+    }
+
+
+def configured_sizes(config):
+    """Rendition sizes from THUMBNAIL_SIZES, ascending"""
+    return tuple(sorted({int(size) for size in config['THUMBNAIL_SIZES'].split(',') if size.strip()}))
+
+
+def sizes_string(sizes):
+    """Sizes as stored in Image.thumbnail_sizes, e.g. "150,400,1200" """
+    return ','.join(str(size) for size in sorted(sizes))
+
+
+def apply_result(result):
+    """
+    Write a render result to every Image row using the blob
+
+    Args:
+        result: dict from render_blob
+
+    Returns:
+        int: Rows updated
+    """
+    values = {Image.thumbnail_status: result['status']}
+    if result['status'] == Image.THUMBNAIL_READY:
+        values.update({
+            Image.thumbnail_width: result['width'],
+            Image.thumbnail_height: result['height'],
+            Image.thumbnail_sizes: result['sizes'],
+            Image.thumbnail_widths: result['widths'],
+            Image.placeholder: result['placeholder'],
+            Image.aspect_ratio: result['aspect_ratio'],
+        })
+    return Image.query.filter_by(blob_name=result['blob_name']).update(values, synchronize_session=False)
+
+
+# storage service of each pool worker process
+_worker_storage = None
+
+
+def _init_worker(storage_config):
+    global _worker_storage
+    _worker_storage = build_storage_service(storage_config)
+
+
+def _render_in_worker(blob_name, sizes, max_pixels):
+    try:
+        return render_blob(_worker_storage, blob_name, sizes, max_pixels)
+    except Exception as e:
+        # transient (network, storage), leave the row as it is
+        return {'blob_name': blob_name, 'status': None, 'error': str(e)}
+
+
+def storage_config(config):
+    """Plain dict of the settings pool workers need to rebuild storage"""
+    return {key: config[key] for key in STORAGE_CONFIG_KEYS}
+
+
+def adopt_legacy_thumbnails(storage, page_size=5000, chunk=500, report=print):
+    """
+    Mark pending images ready when a legacy thumbnail exists
+
+    Images uploaded before thumbnail tracking have a thumbnail named
+    like the original in the thumbnails container. Marking them ready
+    lets the gallery serve it instead of the original until a backfill
+    renders the full set of renditions.
+
+    Args:
+        storage: Storage service
+        page_size: Blobs per listing page
+        chunk: Blob names per UPDATE
+        report: Function receiving progress lines
+
+    Returns:
+        int: Rows marked ready
+    """
+    updated = 0
+    for page in storage.list_blobs(storage.container_thumbnail, page_size):
+        # renditions are "<size>/<name>", legacy thumbnails have no prefix
+        names = [name for name, _ in page if '/' not in name]
+        for start in range(0, len(names), chunk):
+            updated += Image.query.filter(
+                Image.blob_name.in_(names[start:start + chunk]),
+                Image.thumbnail_status == Image.THUMBNAIL_PENDING
+            ).update({Image.thumbnail_status: Image.THUMBNAIL_READY}, synchronize_session=False)
+        db.session.commit()
+        report(f"{updated} images marked ready")
+    return updated
+
+
+def backfill_candidates(sizes, after_id=0, limit=500, retry_failed=False):
+    """
+    Image rows whose thumbnails are missing, stale or lack a placeholder or widths, in ID order
+
+    Args:
+        sizes: Current rendition sizes
+        after_id: Only rows with a larger ID
+        limit: Max rows
+        retry_failed: Include rows marked failed
+
+    Returns:
+        list: (id, blob_name) tuples
+    """
+    wanted = sizes_string(sizes)
+    conditions = [
+        Image.thumbnail_status == Image.THUMBNAIL_PENDING,
+        and_(
+            Image.thumbnail_status == Image.THUMBNAIL_READY,
+            or_(Image.thumbnail_sizes.is_(None), Image.thumbnail_sizes != wanted,
+                Image.placeholder.is_(None), Image.thumbnail_widths.is_(None))
+        ),
+    ]
+    if retry_failed:
+        conditions.append(Image.thumbnail_status == Image.THUMBNAIL_FAILED)
+
+    return db.session.query(Image.id, Image.blob_name).filter(
+        Image.id > after_id,
+        or_(*conditions)
+    ).order_by(Image.id).limit(limit).all()
+
+
+class Checkpoint:
+    """JSON file recording how far a backfill got"""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_id = 0
+        self.processed = 0
+        self.failed = 0
+        if path and os.path.exists(path):
+            with open(path) as fp:
+                data = json.load(fp)
+            self.last_id = data.get('last_id', 0)
+            self.processed = data.get('processed', 0)
+            self.failed = data.get('failed', 0)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump({'last_id': self.last_id, 'processed': self.processed, 'failed': self.failed}, fp)
+        os.replace(tmp_path, self.path)
+
+
+def backfill(config, sizes, workers=4, in_flight=8, batch_size=500, checkpoint_path=None,
+             retry_failed=False, limit=None, commit_every=50, report=print, storage=None):
+    """
+    Regenerate missing or stale thumbnails
+
+    Rows are scanned in ID order. Downloads and rendering run in a
+    process pool with at most in_flight blobs outstanding. Results are
+    committed in small batches, and the checkpoint records the highest
+    ID below which every row has finished without a storage error, so
+    a rerun resumes there and retries rows that hit transient errors.
+
+    Args:
+        config: App config
+        sizes: Rendition sizes
+        workers: Worker processes, 0 to render in this process
+        in_flight: Max blobs being downloaded/rendered at once
+        batch_size: Rows fetched per candidate query
+        checkpoint_path: JSON checkpoint file, None to disable
+        retry_failed: Also retry rows marked failed
+        limit: Stop after this many blobs
+        commit_every: Results per DB commit
+        report: Function receiving progress lines
+        storage: Storage service for in-process mode
+
+    Returns:
+        Checkpoint: Final counters
+    """
+    from app.page_cache import invalidate_gallery
+
+    checkpoint = Checkpoint(checkpoint_path)
+    max_pixels = config['THUMBNAIL_MAX_PIXELS']
+    sizes = tuple(sorted(sizes))
+
+    if workers > 0:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(storage_config(config),))
+        submit = lambda blob_name: pool.submit(_render_in_worker, blob_name, sizes, max_pixels)
+    else:
+        pool = None
+        in_flight = 1
+
+    pending = {}  # future -> row id
+    submitted_ids = []
+    errored_ids = []  # transient storage errors, still pending, kept behind the checkpoint
+    seen_blobs = set()
+    started = time.perf_counter()
+    uncommitted = 0
+    total = 0
+    cursor_id = checkpoint.last_id
+
+    def handle(result, row_id):
+        nonlocal uncommitted
+        if result['status'] is None:
+            checkpoint.failed += 1
+            errored_ids.append(row_id)
+            report(f"error {result['blob_name']}: {result['error']}")
+        else:
+            apply_result(result)
+            checkpoint.processed += 1
+            if result['status'] == Image.THUMBNAIL_FAILED:
+                checkpoint.failed += 1
+                report(f"failed {result['blob_name']}: {result['error']}")
+        submitted_ids.remove(row_id)
+        uncommitted += 1
+
+    def flush():
+        nonlocal uncommitted
+        db.session.commit()
+        unfinished = submitted_ids[:1] + errored_ids
+        checkpoint.last_id = min(unfinished) - 1 if unfinished else cursor_id
+        checkpoint.save()
+        uncommitted = 0
+        elapsed = time.perf_counter() - started
+        report(f"{checkpoint.processed} done, {checkpoint.failed} failed, "
+               f"{total / elapsed if elapsed else 0:.1f} images/s, checkpoint id {checkpoint.last_id}")
+
+    try:
+        while limit is None or total < limit:
+            rows = backfill_candidates(sizes, after_id=cursor_id, limit=batch_size, retry_failed=retry_failed)
+            if not rows:
+                break
+
+            for row_id, blob_name in rows:
+                if limit is not None and total >= limit:
+                    break
+                cursor_id = row_id
+                if blob_name in seen_blobs:
+                    continue  # shared blob already rendered in this run
+                seen_blobs.add(blob_name)
+                submitted_ids.append(row_id)
+                total += 1
+
+                if pool is None:
+                    try:
+                        result = render_blob(storage, blob_name, sizes, max_pixels)
+                    except Exception as e:
+                        result = {'blob_name': blob_name, 'status': None, 'error': str(e)}
+                    handle(result, row_id)
+                else:
+                    pending[submit(blob_name)] = row_id
+
+                # bounded in-flight work keeps downloads and memory in check
+                while len(pending) >= in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle(future.result(), pending.pop(future))
+
+                if uncommitted >= commit_every:
+                    flush()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                handle(future.result(), pending.pop(future))
+
+        flush()
+        if errored_ids:
+            report(f"{len(errored_ids)} images hit storage errors and are still pending, rerun to retry them")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        invalidate_gallery()
+
+    return checkpoint
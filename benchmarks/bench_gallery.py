@@ -0,0 +1,69 @@
+"""Gallery latency and query counts at different table sizes"""
+
+import os
+import tempfile
+from app.gallery import encode_cursor
+from app.models import Image
+from benchmarks.common import make_app, seed, QueryCounter, timed_calls
+
+
+def _deep_cursor(app, n_images):
+    """Cursor pointing at the middle of the table"""
+    with app.app_context():
+        image = Image.query.order_by(Image.upload_date.desc(), Image.id.desc()).offset(n_images // 2).first()
+        return encode_cursor(image.upload_date, image.id)
+
+
+def run(sizes=(100, 10_000, 100_000), repeat=50):
+    """
+    Benchmark /gallery and /api/gallery
+
+    Args:
+        sizes: Image counts to seed
+        repeat: Requests per measurement
+
+    Returns:
+        dict: size -> scenario -> latency/query stats
+    """
+    results = {}
+    for n_images in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app, _ = make_app(os.path.join(tmp, 'bench.db'))
+            seed(app, n_images)
+            client = app.test_client()
+            deep = _deep_cursor(app, n_images)
+            counter = QueryCounter(app)
+
+            scenarios = {
+                'gallery_first_page': '/gallery',
+                'gallery_deep_page': f'/gallery?cursor={deep}',
+                'feed_first_page': '/api/gallery',
+                'feed_deep_page': f'/api/gallery?cursor={deep}',
+            }
+
+            size_results = {}
+            for name, url in scenarios.items():
+                client.get(url)  # warm up
+                with counter:
+                    stats = timed_calls(lambda: client.get(url), repeat)
+                stats['queries_per_request'] = counter.count / repeat
+                size_results[name] = stats
+
+            # conditional revisit
+            etag = client.get('/gallery').headers['ETag']
+            size_results['gallery_304'] = timed_calls(
+                lambda: client.get('/gallery', headers={'If-None-Match': etag}), repeat
+            )
+
+            results[str(n_images)] = size_results
+
+        with tempfile.TemporaryDirectory() as tmp:
+            app, _ = make_app(os.path.join(tmp, 'bench.db'), page_cache='memory')
+            seed(app, n_images)
+            client = app.test_client()
+            client.get('/gallery')
+            results[str(n_images)]['gallery_first_page_cached'] = timed_calls(
+                lambda: client.get('/gallery'), repeat
+            )
+
+    return results
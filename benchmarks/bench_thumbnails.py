@@ -0,0 +1,106 @@
+"""Thumbnail rendering time and peak memory across source sizes"""
+
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# not imported from benchmarks.common, so worker processes stay free of
+# the Flask app and its imports and peak RSS reflects the render alone
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'functions', 'thumbnail_generator')
+
+
+def _make_source(path, megapixels):
+    """Write a noisy JPEG of roughly the given size"""
+    from PIL import Image
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    Image.effect_noise((width, height), 48).convert('RGB').save(path, 'JPEG', quality=90)
+    return width, height
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux), so earlier imports don't count"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as fp:
+            fp.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_kb():
+    """Peak RSS of this process in KB"""
+    try:
+        with open('/proc/self/status') as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _current_rss_kb():
+    """Current RSS of this process in KB"""
+    try:
+        with open('/proc/self/status') as fp:
+            for line in fp:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _render(path, sizes):
+    """Runs in a fresh process so peak RSS belongs to this render only"""
+    sys.path.insert(0, FUNCTION_DIR)
+    from renditions import open_image, render_renditions
+
+    _reset_peak_rss()
+    baseline_kb = _current_rss_kb()
+    start = time.perf_counter()
+    with open(path, 'rb') as fp:
+        img = open_image(fp, max(sizes), max_pixels=None)
+        renditions = render_renditions(img, os.path.basename(path), sizes)
+    elapsed = time.perf_counter() - start
+    peak_kb = _peak_rss_kb()
+
+    return {
+        'seconds': round(elapsed, 3),
+        'peak_rss_delta_mb': round((peak_kb - baseline_kb) / 1024, 1),
+        'output_kb': round(sum(len(r['data']) for r in renditions) / 1024, 1),
+    }
+
+
+def run(megapixels=(1, 12, 48), sizes=(150, 400, 1200)):
+    """
+    Benchmark renditions.render_renditions
+
+    Args:
+        megapixels: Source sizes to test
+        sizes: Rendition sizes to produce
+
+    Returns:
+        dict: megapixels -> time/memory stats
+    """
+    results = {}
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mp in megapixels:
+            path = os.path.join(tmp, f'source_{mp}mp.jpg')
+            width, height = _make_source(path, mp)
+
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                stats = pool.submit(_render, path, tuple(sizes)).result()
+
+            stats['source'] = f'{width}x{height}'
+            stats['source_kb'] = round(os.path.getsize(path) / 1024, 1)
+            results[f'{mp}mp'] = stats
+
+    return results
@@ -0,0 +1,80 @@
+"""Upload throughput against latency-injected in-memory storage"""
+
+import io
+import os
+import tempfile
+import time
+from app.memory_storage import InMemoryStorageService
+from app.models import db, User
+from benchmarks.common import make_app
+
+
+def _login(app, client):
+    with app.app_context():
+        user = User(username='uploader')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.commit()
+    client.post('/login', data={'username': 'uploader', 'password': 'benchmark'})
+
+
+def run(files=50, size_kb=512, storage_latency=0.02, batch_size=10):
+    """
+    Benchmark single, batch and duplicate uploads
+
+    Every file has distinct content, so single and batch measure real
+    transfers; the dedup scenario re-posts the single-upload files,
+    which are all content-hash hits and skip storage.
+
+    Args:
+        files: Files uploaded per scenario
+        size_kb: Size of each file
+        storage_latency: Seconds added to every storage upload
+        batch_size: Files per batch request
+
+    Returns:
+        dict: scenario -> throughput stats
+    """
+    # distinct content per file, generated up front so it is not timed
+    singles = [os.urandom(size_kb * 1024) for _ in range(files)]
+    batches = [os.urandom(size_kb * 1024) for _ in range(files)]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = InMemoryStorageService(latency={'upload_file': storage_latency})
+        app, _ = make_app(os.path.join(tmp, 'bench.db'), storage=storage)
+        client = app.test_client()
+        _login(app, client)
+
+        start = time.perf_counter()
+        for i in range(files):
+            client.post('/upload', data={'image': (io.BytesIO(singles[i]), f'photo{i}.jpg'), 'caption': ''},
+                        content_type='multipart/form-data')
+        results['single'] = _throughput(files, size_kb, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for offset in range(0, files, batch_size):
+            count = min(batch_size, files - offset)
+            client.post('/api/upload/batch',
+                        data={'images': [(io.BytesIO(batches[offset + i]), f'batch{offset + i}.jpg')
+                                         for i in range(count)]},
+                        content_type='multipart/form-data')
+        results['batch'] = _throughput(files, size_kb, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(files):
+            client.post('/upload', data={'image': (io.BytesIO(singles[i]), f'repost{i}.jpg'), 'caption': ''},
+                        content_type='multipart/form-data')
+        results['dedup'] = _throughput(files, size_kb, time.perf_counter() - start)
+
+        results['stored_blobs'] = len(storage.blobs[storage.container_original])
+
+    return results
+
+
+def _throughput(files, size_kb, seconds):
+    return {
+        'seconds': round(seconds, 3),
+        'files_per_sec': round(files / seconds, 2),
+        'mb_per_sec': round(files * size_kb / 1024 / seconds, 2),
+    }
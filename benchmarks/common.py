@@ -0,0 +1,133 @@
+"""Shared helpers for the benchmark suite"""
+
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert
+from app import create_app
+from app.blob_service import init_blob_service
+from app.config import Config
+from app.memory_storage import InMemoryStorageService
+from app.models import db, User, Image
+
+
+def make_app(db_path, storage=None, page_cache='none', **config):
+    """
+    Build an app on a SQLite file with in-memory storage
+
+    Args:
+        db_path: SQLite database file
+        storage: Storage service, default InMemoryStorageService()
+        page_cache: PAGE_CACHE_BACKEND to use
+        **config: Extra config values, e.g. DATABASE_REPLICA_URLS
+
+    Returns:
+        tuple: (app, storage)
+    """
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        PAGE_CACHE_BACKEND = page_cache
+        WTF_CSRF_ENABLED = False
+        SERVER_TIMING = False
+        TESTING = True
+
+    for key, value in config.items():
+        setattr(BenchConfig, key, value)
+
+    app = create_app(BenchConfig)
+    storage = storage or InMemoryStorageService()
+    init_blob_service(app, storage)
+    with app.app_context():
+        db.create_all()
+    return app, storage
+
+
+def seed(app, n_images, n_users=100, thumbnail_ready=0.9, chunk=5000):
+    """
+    Insert users and images with bulk inserts
+
+    Args:
+        app: Flask app
+        n_images: Images to insert
+        n_users: Users the images are spread across
+        thumbnail_ready: Share of images whose thumbnails are ready
+        chunk: Rows per INSERT
+
+    Returns:
+        list: User IDs
+    """
+    with app.app_context():
+        users = [User(username=f'user{i}', password_hash='x') for i in range(n_users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+
+        start = datetime(2024, 1, 1)
+        ready_every = max(1, round(1 / (1 - thumbnail_ready))) if thumbnail_ready < 1 else None
+        for offset in range(0, n_images, chunk):
+            rows = []
+            for i in range(offset, min(offset + chunk, n_images)):
+                ready = ready_every is None or i % ready_every != 0
+                rows.append({
+                    'caption': f'Pet photo {i}',
+                    'blob_name': f'{i:08d}.jpg',
+                    'upload_date': start + timedelta(seconds=i),
+                    'user_id': user_ids[i % n_users],
+                    'thumbnail_status': Image.THUMBNAIL_READY if ready else Image.THUMBNAIL_PENDING,
+                    'thumbnail_sizes': '150,400,1200' if ready else None,
+                    'thumbnail_widths': '150,400,1200' if ready else None,
+                })
+            db.session.execute(insert(Image), rows)
+            db.session.commit()
+        return user_ids
+
+
+class QueryCounter:
+    """Counts SQL statements run on the app's engine"""
+
+    def __init__(self, app):
+        with app.app_context():
+            self.engine = db.engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def timed_calls(func, repeat):
+    """
+    Call func repeatedly and summarise latency
+
+    Args:
+        func: Function taking no arguments
+        repeat: Number of calls
+
+    Returns:
+        dict: p50/p95/mean/max in milliseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarise(samples)
+
+
+def summarise(samples_ms):
+    """Latency summary for a list of millisecond samples"""
+    ordered = sorted(samples_ms)
+    return {
+        'p50_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'max_ms': round(ordered[-1], 3),
+    }
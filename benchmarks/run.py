@@ -0,0 +1,94 @@
+"""Run the benchmark suite and compare against a previous run
+
+Examples:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --suite gallery --sizes 100,10000 --compare bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime
+from benchmarks import bench_gallery, bench_thumbnails, bench_upload
+
+
+def _flatten(data, prefix=''):
+    """Flatten nested result dicts into dotted keys with numeric values"""
+    flat = {}
+    for key, value in data.items():
+        name = f'{prefix}.{key}' if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, previous):
+    """
+    Print the change of every numeric result between two runs
+
+    Args:
+        current: Results of this run
+        previous: Results loaded from an earlier output file
+    """
+    now = _flatten(current['results'])
+    before = _flatten(previous['results'])
+
+    print(f"\n{'metric':<70} {'before':>12} {'after':>12} {'change':>9}")
+    for name in sorted(now):
+        if name not in before:
+            continue
+        old, new = before[name], now[name]
+        change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+        print(f'{name:<70} {old:>12} {new:>12} {change:>9}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='FurryFriends Fotos benchmarks')
+    parser.add_argument('--suite', choices=['all', 'gallery', 'upload', 'thumbnails'], default='all')
+    parser.add_argument('--sizes', default='100,10000,100000', help='image counts for the gallery suite')
+    parser.add_argument('--repeat', type=int, default=50, help='requests per gallery measurement')
+    parser.add_argument('--files', type=int, default=50, help='files per upload scenario')
+    parser.add_argument('--storage-latency', type=float, default=0.02, help='seconds per storage upload')
+    parser.add_argument('--megapixels', default='1,12,48', help='source sizes for the thumbnail suite')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='earlier JSON output to compare against')
+    args = parser.parse_args(argv)
+
+    results = {}
+    if args.suite in ('all', 'gallery'):
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results['gallery'] = bench_gallery.run(sizes=sizes, repeat=args.repeat)
+    if args.suite in ('all', 'upload'):
+        results['upload'] = bench_upload.run(files=args.files, storage_latency=args.storage_latency)
+    if args.suite in ('all', 'thumbnails'):
+        megapixels = [float(mp) if '.' in mp else int(mp) for mp in args.megapixels.split(',')]
+        results['thumbnails'] = bench_thumbnails.run(megapixels=megapixels)
+
+    output = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+
+    print(json.dumps(output['results'], indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(output, fp, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(output, json.load(fp))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
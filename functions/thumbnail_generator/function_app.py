@@ -1,49 +1,149 @@
 import azure.functions as func
+import azurefunctions.extensions.bindings.blob as blob
+import json
 import logging
-from io import BytesIO
-from PIL import Image
-from azure.storage.blob import BlobServiceClient
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from azure.storage.blob import BlobServiceClient, ContentSettings
 import os
+from renditions import (CACHE_CONTROL, DEFAULT_MAX_PIXELS, ImageTooLargeError, aspect_ratio,
+                        open_image, parse_sizes, render_placeholder, render_renditions,
+                        rendition_widths)
 
 app = func.FunctionApp()
 
-@app.blob_trigger(arg_name="myblob",
+# renditions to produce, e.g. "150,400,1200"
+THUMBNAIL_SIZES = parse_sizes(os.environ.get("THUMBNAIL_SIZES"))
+
+# max pixels a source may decode to (after JPEG draft scaling)
+MAX_DECODED_PIXELS = int(os.environ.get("THUMBNAIL_MAX_PIXELS", DEFAULT_MAX_PIXELS))
+
+# originals up to this size are buffered in memory, larger ones spill to disk
+SPOOL_MAX_BYTES = int(os.environ.get("THUMBNAIL_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+
+# thumbnails downloaded and rendered at once in this worker process,
+# keep equal to extensions.blobs.maxDegreeOfParallelism in host.json
+MAX_CONCURRENT = int(os.environ.get("THUMBNAIL_MAX_CONCURRENT", 2))
+_render_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+_blob_service_client = None
+_client_lock = threading.Lock()
+
+
+def get_blob_service_client():
+    """Storage client shared by every invocation in this worker process"""
+    global _blob_service_client
+    if _blob_service_client is None:
+        with _client_lock:
+            if _blob_service_client is None:
+                connection_string = os.environ["BUSINESS_STORAGE_CONNECTION_STRING"]
+                _blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+    return _blob_service_client
+
+
+def report_thumbnail_status(filename, status, width=None, height=None, sizes=None, widths=None,
+                            placeholder=None, ratio=None, attempts=3):
+    """Tell the web app the thumbnail state so the gallery never probes storage"""
+    callback_url = os.environ.get("THUMBNAIL_CALLBACK_URL")
+    if not callback_url:
+        logging.warning("THUMBNAIL_CALLBACK_URL not set, skipping status callback")
+        return
+
+    payload = json.dumps({
+        "blob_name": filename,
+        "status": status,
+        "width": width,
+        "height": height,
+        "sizes": list(sizes) if sizes else None,
+        "widths": list(widths) if widths else None,
+        "placeholder": placeholder,
+        "aspect_ratio": ratio
+    }).encode("utf-8")
+
+    for attempt in range(1, attempts + 1):
+        req = urllib.request.Request(
+            callback_url,
+            data=payload,
+            headers={
+                "Content-Type": "application/json",
+                "X-Callback-Token": os.environ.get("THUMBNAIL_CALLBACK_TOKEN", "")
+            },
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=10):
+                return
+        except (urllib.error.URLError, OSError) as e:
+            # 404 means the image row is not committed yet
+            logging.warning(f"Status callback attempt {attempt} failed for {filename}: {e}")
+            if attempt < attempts:
+                time.sleep(2 ** attempt)
+
+    logging.error(f"Could not report thumbnail status for {filename}")
+
+@app.blob_trigger(arg_name="client",
                   path="originals/{name}",
                   connection="BUSINESS_STORAGE_CONNECTION_STRING")
-def thumbnail_generator(myblob: func.InputStream):
-    logging.info(f"Processing blob: {myblob.name}, Size: {myblob.length} bytes")
+def thumbnail_generator(client: blob.BlobClient):
+    # SDK-type binding: the host passes a reference, not the blob content,
+    # so nothing is held in memory until a render slot is free
+    filename = client.blob_name.split('/')[-1]
 
     try:
-        # read image from blob
-        img_data = myblob.read()
-        img = Image.open(BytesIO(img_data))
+        with _render_slots:
+            # stream the original into a seekable spool instead of one big read()
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+                downloader = get_blob_service_client().get_blob_client(
+                    container="originals",
+                    blob=client.blob_name
+                ).download_blob()
+                logging.info(f"Processing blob: {client.blob_name}, Size: {downloader.size} bytes")
+                downloader.readinto(spool)
+                spool.seek(0)
 
-        # generate thumbnail (150x150)
-        img.thumbnail((150, 150), Image.Resampling.LANCZOS)
+                try:
+                    img = open_image(spool, max(THUMBNAIL_SIZES), MAX_DECODED_PIXELS)
+                except ImageTooLargeError as e:
+                    # retrying will not help, mark it failed and stop
+                    logging.warning(f"Skipping {filename}: {e}")
+                    report_thumbnail_status(filename, "failed")
+                    return
 
-        # save to bytes
-        output = BytesIO()
-        img_format = img.format if img.format else 'JPEG'
-        img.save(output, format=img_format)
-        output.seek(0)
+                # WebP renditions plus JPEG fallbacks for each size
+                renditions = render_renditions(img, filename, THUMBNAIL_SIZES)
+                ratio = aspect_ratio(img)
+                img.close()
 
-        # upload to thumbnails container
-        connection_string = os.environ["BUSINESS_STORAGE_CONNECTION_STRING"]
-        blob_service = BlobServiceClient.from_connection_string(connection_string)
+            smallest = min(renditions, key=lambda r: r["size"])
+            placeholder = render_placeholder(smallest["data"])
 
-        # extract filename from path
-        filename = myblob.name.split('/')[-1]
+        blob_service = get_blob_service_client()
 
         # upload to thumbnails container
-        blob_client = blob_service.get_blob_client(
-            container="thumbnails",
-            blob=filename
-        )
-
-        blob_client.upload_blob(output.getvalue(), overwrite=True)
+        for rendition in renditions:
+            blob_client = blob_service.get_blob_client(
+                container="thumbnails",
+                blob=rendition["name"]
+            )
+            blob_client.upload_blob(
+                rendition["data"],
+                overwrite=True,
+                content_settings=ContentSettings(
+                    content_type=rendition["content_type"],
+                    cache_control=CACHE_CONTROL
+                )
+            )
 
         logging.info(f"Thumbnail created successfully: {filename}")
 
     except Exception as e:
         logging.error(f"Error processing blob: {str(e)}")
+        report_thumbnail_status(filename, "failed")
         raise
+
+    report_thumbnail_status(filename, "ready", width=smallest["width"], height=smallest["height"],
+                            sizes=THUMBNAIL_SIZES, widths=rendition_widths(renditions),
+                            placeholder=placeholder, ratio=ratio)
@@ -0,0 +1,216 @@
+"""Thumbnail rendition rendering shared by the function and the web app
+
+Only depends on Pillow, so the web app can import it for backfills
+without the Azure Functions runtime.
+"""
+
+import base64
+import os
+from io import BytesIO
+from PIL import Image, ImageOps
+
+DEFAULT_SIZES = (150, 400, 1200)
+
+# default decoded-pixel budget: 50 MP is ~200 MB decoded (Pillow keeps RGB
+# at 4 bytes per pixel), plus the largest rendition. EXIF-rotated and
+# non-RGB sources briefly need a second full-size buffer for the transpose
+# or conversion, so budget ~400 MB per render slot
+DEFAULT_MAX_PIXELS = 50_000_000
+
+
+class ImageTooLargeError(ValueError):
+    """Image would decode to more pixels than the budget allows"""
+
+# renditions are named per original, so they never change once written
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# longest edge of the inline placeholder, blurred up by the browser
+PLACEHOLDER_EDGE = 16
+
+# format name -> (file extension, content type, save options)
+FORMATS = {
+    'WEBP': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def parse_sizes(value):
+    """
+    Parse a comma separated size list such as "150,400,1200"
+
+    Args:
+        value: Size list string, or None for the defaults
+
+    Returns:
+        tuple: Sizes in ascending order
+    """
+    if not value:
+        return DEFAULT_SIZES
+    return tuple(sorted({int(part) for part in value.split(',') if part.strip()}))
+
+
+def rendition_name(blob_name, size, fmt):
+    """
+    Blob name of one rendition inside the thumbnails container
+
+    Args:
+        blob_name: Original blob name
+        size: Bounding box edge in pixels
+        fmt: 'WEBP' or 'JPEG'
+
+    Returns:
+        str: e.g. "400/<uuid>.webp"
+    """
+    stem = os.path.splitext(blob_name)[0]
+    return f"{size}/{stem}.{FORMATS[fmt][0]}"
+
+
+def open_image(fp, largest_size, max_pixels=DEFAULT_MAX_PIXELS):
+    """
+    Open an image for resizing
+
+    Only the header is read here. JPEGs are decoded at a reduced scale
+    via draft() when the largest rendition is much smaller than the
+    source, so big phone photos are never decoded at full resolution.
+    Anything that would still decode above max_pixels is rejected
+    before any pixel data is loaded.
+
+    Args:
+        fp: Seekable file object
+        largest_size: Largest rendition edge that will be produced
+        max_pixels: Decoded pixel budget, None for no limit
+
+    Returns:
+        PIL Image, orientation corrected
+
+    Raises:
+        ImageTooLargeError: If the decoded image would exceed max_pixels
+                            or Pillow's decompression bomb limit
+    """
+    try:
+        img = Image.open(fp)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    if img.format == 'JPEG':
+        img.draft('RGB', (largest_size, largest_size))
+
+    width, height = img.size
+    if max_pixels is not None and width * height > max_pixels:
+        img.close()
+        raise ImageTooLargeError(f"{width}x{height} exceeds the {max_pixels} pixel budget")
+
+    # in place: without an orientation tag this only decodes, no full-size copy
+    ImageOps.exif_transpose(img, in_place=True)
+    return img
+
+
+def fit(img, size):
+    """
+    Scale an image down to fit a size x size box
+
+    Unlike thumbnail() this never copies the source: an image that
+    already fits is returned as is, anything else is resized straight
+    into a new image of the target size.
+
+    Args:
+        img: PIL Image, not modified
+        size: Bounding box edge in pixels
+
+    Returns:
+        PIL Image, possibly img itself
+    """
+    if img.width <= size and img.height <= size:
+        return img
+    scale = min(size / img.width, size / img.height)
+    box = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(box, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def render_renditions(img, blob_name, sizes=DEFAULT_SIZES):
+    """
+    Render every size in WebP plus a JPEG fallback
+
+    Args:
+        img: Image from open_image
+        blob_name: Original blob name
+        sizes: Bounding box edges in pixels
+
+    Returns:
+        list: dicts with name, size, format, content_type, data, width, height
+    """
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+    renditions = []
+    current = img
+    # largest first, each step resizes from the previous (smaller) result
+    for size in sorted(sizes, reverse=True):
+        current = fit(current, size)
+
+        for fmt, (_, content_type, options) in FORMATS.items():
+            frame = current.convert('RGB') if fmt == 'JPEG' and current.mode != 'RGB' else current
+            output = BytesIO()
+            frame.save(output, format=fmt, **options)
+            renditions.append({
+                'name': rendition_name(blob_name, size, fmt),
+                'size': size,
+                'format': fmt,
+                'content_type': content_type,
+                'data': output.getvalue(),
+                'width': current.width,
+                'height': current.height
+            })
+
+    return renditions
+
+
+def rendition_widths(renditions):
+    """
+    Actual pixel width per size, smallest size first
+
+    thumbnail() never upscales, so sizes above the source's width all
+    come out at the source's width.
+
+    Args:
+        renditions: Result of render_renditions
+
+    Returns:
+        list: Widths in ascending size order
+    """
+    widths = {rendition['size']: rendition['width'] for rendition in renditions}
+    return [widths[size] for size in sorted(widths)]
+
+
+def aspect_ratio(img):
+    """
+    Width over height of an opened image
+
+    Args:
+        img: Image from open_image
+
+    Returns:
+        float: Aspect ratio rounded to 4 places
+    """
+    return round(img.width / img.height, 4)
+
+
+def render_placeholder(data, edge=PLACEHOLDER_EDGE):
+    """
+    Tiny JPEG data URI shown while the real thumbnail loads
+
+    Built from the smallest rendition rather than the source, so it
+    costs next to nothing. A few hundred bytes once base64 encoded.
+
+    Args:
+        data: Encoded bytes of a small rendition
+        edge: Longest edge of the placeholder in pixels
+
+    Returns:
+        str: "data:image/jpeg;base64,..."
+    """
+    with Image.open(BytesIO(data)) as img:
+        img = img.convert('RGB')
+        img.thumbnail((edge, edge), Image.Resampling.BILINEAR)
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=40, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
@@ -0,0 +1,46 @@
+"""Shared fixtures: an app on a temporary SQLite file with in-memory storage"""
+
+import io
+import pytest
+from PIL import Image as PILImage
+from benchmarks.common import make_app
+from app.models import db, User
+
+
+@pytest.fixture
+def app(tmp_path):
+    app, _ = make_app(str(tmp_path / 'app.db'))
+    return app
+
+
+@pytest.fixture
+def storage(app):
+    return app.extensions['blob_service']
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create_user(app, username, password='secret1'):
+    """Insert a user and return its ID"""
+    with app.app_context():
+        user = User(username=username)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def login(client, username, password='secret1'):
+    """Log the test client in"""
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302
+
+
+def png_bytes(color='red', size=(32, 24)):
+    """Small PNG file contents"""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
@@ -0,0 +1,190 @@
+"""App tests on SQLite and InMemoryStorageService"""
+
+import io
+from datetime import datetime
+import pytest
+from benchmarks.common import make_app
+from app.gallery import encode_cursor, decode_cursor, rendition_name
+from app.models import db, User, Image
+from tests.conftest import create_user, login, png_bytes
+
+CALLBACK_TOKEN = 'callback-secret'
+
+
+def upload(client, data, caption=''):
+    return client.post('/upload', data={'image': (io.BytesIO(data), 'pet.png'), 'caption': caption},
+                       content_type='multipart/form-data')
+
+
+def test_cursor_round_trip():
+    upload_date = datetime(2024, 5, 17, 12, 30, 45, 123456)
+    cursor = encode_cursor(upload_date, 42)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (upload_date, 42)
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', 'bm9waXBl', '!!!'])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_gallery_feed_pages_with_cursor(app, client):
+    user_id = create_user(app, 'alice')
+    with app.app_context():
+        db.session.add_all([
+            Image(caption=f'pet {i}', blob_name=f'{i}.png', user_id=user_id,
+                  upload_date=datetime(2024, 1, 1, 0, 0, i))
+            for i in range(30)
+        ])
+        db.session.commit()
+
+    first = client.get('/api/gallery').get_json()
+    second = client.get('/api/gallery', query_string={'cursor': first['next_cursor']}).get_json()
+
+    captions = [item['caption'] for item in first['images'] + second['images']]
+    assert captions == [f'pet {i}' for i in reversed(range(30))]
+    assert second['next_cursor'] is None
+    assert client.get('/api/gallery', query_string={'cursor': 'garbage'}).status_code == 400
+
+
+@pytest.fixture
+def callback_app(tmp_path):
+    app, _ = make_app(str(tmp_path / 'app.db'), THUMBNAIL_CALLBACK_TOKEN=CALLBACK_TOKEN)
+    user_id = create_user(app, 'alice')
+    with app.app_context():
+        db.session.add(Image(caption='cat', blob_name='cat.png', user_id=user_id))
+        db.session.commit()
+    return app
+
+
+def callback(client, payload, token=CALLBACK_TOKEN):
+    return client.post('/api/thumbnails/callback', json=payload, headers={'X-Callback-Token': token})
+
+
+def test_callback_requires_token(callback_app):
+    client = callback_app.test_client()
+    payload = {'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY}
+
+    assert callback(client, payload, token='wrong').status_code == 403
+    assert client.post('/api/thumbnails/callback', json=payload).status_code == 403
+
+
+def test_callback_disabled_without_token(app, client):
+    assert callback(client, {'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY}).status_code == 404
+
+
+@pytest.mark.parametrize('payload', [
+    {'blob_name': 'cat.png', 'status': 'done'},
+    {'blob_name': '', 'status': Image.THUMBNAIL_READY},
+    {'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY, 'width': -1},
+    {'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY, 'sizes': [150, 'big']},
+    {'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY, 'sizes': [150, 400], 'widths': [150]},
+    {'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY, 'sizes': list(range(1, 200))},
+])
+def test_callback_rejects_invalid_payload(callback_app, payload):
+    assert callback(callback_app.test_client(), payload).status_code == 400
+
+
+def test_callback_updates_image(callback_app):
+    client = callback_app.test_client()
+    response = callback(client, {
+        'blob_name': 'cat.png', 'status': Image.THUMBNAIL_READY, 'width': 150, 'height': 100,
+        'sizes': [400, 150], 'widths': [400, 150], 'aspect_ratio': 1.5,
+        'placeholder': 'data:image/webp;base64,AAAA',
+    })
+
+    assert response.get_json() == {'updated': 1}
+    with callback_app.app_context():
+        image = Image.query.filter_by(blob_name='cat.png').one()
+        assert image.thumbnail_status == Image.THUMBNAIL_READY
+        assert image.thumbnail_sizes == '150,400'
+        assert image.thumbnail_widths == '150,400'
+        assert image.aspect_ratio == 1.5
+    assert callback(client, {'blob_name': 'dog.png', 'status': Image.THUMBNAIL_READY}).status_code == 404
+
+
+def test_repost_shares_blob_until_last_delete(app, client, storage):
+    create_user(app, 'alice')
+    login(client, 'alice')
+    data = png_bytes()
+
+    assert upload(client, data, 'first').status_code == 302
+    assert upload(client, data, 'again').status_code == 302
+
+    with app.app_context():
+        first, second = Image.query.order_by(Image.id).all()
+        assert second.blob_name == first.blob_name
+        first_id, second_id, blob_name = first.id, second.id, first.blob_name
+    assert list(storage.blobs[storage.container_original]) == [blob_name]
+    storage.put_blob(storage.container_thumbnail, rendition_name(blob_name, 150, 'WEBP'), b'thumb')
+
+    response = client.delete(f'/api/images/{first_id}')
+    assert response.get_json() == {'deleted': first_id, 'blobs_deleted': 0}
+    assert blob_name in storage.blobs[storage.container_original]
+
+    response = client.delete(f'/api/images/{second_id}')
+    assert response.get_json() == {'deleted': second_id, 'blobs_deleted': 2}
+    assert storage.blobs[storage.container_original] == {}
+    assert storage.blobs[storage.container_thumbnail] == {}
+
+
+def test_delete_other_users_image_is_forbidden(app, client):
+    owner_id = create_user(app, 'alice')
+    create_user(app, 'bob')
+    with app.app_context():
+        image = Image(caption='cat', blob_name='cat.png', user_id=owner_id)
+        db.session.add(image)
+        db.session.commit()
+        image_id = image.id
+
+    login(client, 'bob')
+    assert client.delete(f'/api/images/{image_id}').status_code == 403
+
+
+@pytest.mark.parametrize('page_cache', ['none', 'memory'])
+def test_gallery_etag_changes_after_upload(tmp_path, page_cache):
+    app, _ = make_app(str(tmp_path / 'app.db'), page_cache=page_cache)
+    create_user(app, 'alice')
+    viewer, uploader = app.test_client(), app.test_client()
+    login(uploader, 'alice')
+
+    first = viewer.get('/api/gallery')
+    etag = first.headers['ETag']
+    assert viewer.get('/api/gallery', headers={'If-None-Match': etag}).status_code == 304
+
+    assert upload(uploader, png_bytes(), 'new cat').status_code == 302
+
+    response = viewer.get('/api/gallery', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [item['caption'] for item in response.get_json()['images']] == ['new cat']
+
+
+def test_reads_go_to_replica_until_browser_writes(tmp_path):
+    replica_path = str(tmp_path / 'replica.db')
+    replica, _ = make_app(replica_path)
+    replica_user = create_user(replica, 'alice')
+    with replica.app_context():
+        db.session.add(Image(caption='from replica', blob_name='r.png', user_id=replica_user))
+        db.session.commit()
+
+    app, _ = make_app(str(tmp_path / 'primary.db'), DATABASE_REPLICA_URLS=[f'sqlite:///{replica_path}'])
+    primary_user = create_user(app, 'alice')
+    with app.app_context():
+        db.session.add(Image(caption='from primary', blob_name='p.png', user_id=primary_user))
+        db.session.commit()
+    client = app.test_client()
+
+    def captions():
+        return [item['caption'] for item in client.get('/api/gallery').get_json()['images']]
+
+    assert captions() == ['from replica']
+
+    response = client.post('/register', data={'username': 'bob', 'password': 'secret1', 'confirm_password': 'secret1'})
+    assert response.status_code == 302
+    assert captions() == ['from primary']
+
+    with app.app_context():
+        assert User.query.filter_by(username='bob').count() == 1